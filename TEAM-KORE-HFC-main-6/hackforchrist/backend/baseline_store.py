@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from features import FEATURE_NAMES
+
+
+class BaselineStore:
+    """
+    Per-service exponentially weighted baselines of the scan feature vector.
+
+    observe() hands back the baseline a scan should be compared against and
+    folds the new vector in (baseline = alpha * x + (1 - alpha) * baseline),
+    O(1) per scan and atomic under a lock, so concurrent scans never see a
+    half-updated baseline. State is snapshotted to a JSON file (temp file and
+    rename) by a background task while it is dirty and once more on stop(),
+    and loaded back by load() at startup.
+    """
+
+    def __init__(self, path, alpha=0.3, snapshot_interval=30.0):
+        self.path = path
+        self.alpha = alpha
+        self.snapshot_interval = snapshot_interval
+        self._baselines = {}  # service -> {"features": ndarray, "scans": int, "updated_at": float}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._task = None
+        self._stopping = None
+
+        self.snapshots = 0
+        self.last_snapshot_ms = 0.0
+
+    def __len__(self):
+        return len(self._baselines)
+
+    def get(self, service):
+        """Current baseline for a service as a {feature: value} dict, or None."""
+        with self._lock:
+            entry = self._baselines.get(service)
+            return dict(zip(FEATURE_NAMES, entry["features"].tolist())) if entry else None
+
+    def observe(self, service, features):
+        """
+        Fold one scan's feature vector (len(FEATURE_NAMES) values) into the
+        service's baseline. Returns the baseline from before this scan, as an
+        array, or None for the first scan of a service.
+        """
+        x = np.asarray(features, dtype=np.float64).reshape(-1)
+        with self._lock:
+            entry = self._baselines.get(service)
+            if entry is None:
+                self._baselines[service] = {"features": x.copy(), "scans": 1, "updated_at": time.time()}
+                previous = None
+            else:
+                previous = entry["features"]
+                entry["features"] = self.alpha * x + (1 - self.alpha) * previous
+                entry["scans"] += 1
+                entry["updated_at"] = time.time()
+            self._dirty = True
+        return previous
+
+    def load(self):
+        """Replace the in-memory baselines with the last snapshot, if there is one."""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable baseline snapshot {self.path}: {e}")
+            return 0
+
+        names = data.get("feature_names", FEATURE_NAMES)
+        baselines = {}
+        for service, entry in data.get("services", {}).items():
+            values = dict(zip(names, entry["features"]))
+            if not all(name in values for name in FEATURE_NAMES):
+                continue
+            baselines[service] = {
+                "features": np.array([values[name] for name in FEATURE_NAMES], dtype=np.float64),
+                "scans": entry.get("scans", 1),
+                "updated_at": entry.get("updated_at", 0.0)
+            }
+        with self._lock:
+            self._baselines = baselines
+            self._dirty = False
+        return len(baselines)
+
+    def snapshot(self):
+        """Write all baselines to disk atomically."""
+        started = time.perf_counter()
+        with self._lock:
+            services = {
+                service: {
+                    "features": entry["features"].tolist(),
+                    "scans": entry["scans"],
+                    "updated_at": entry["updated_at"]
+                }
+                for service, entry in self._baselines.items()
+            }
+            self._dirty = False
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"alpha": self.alpha, "feature_names": FEATURE_NAMES, "services": services}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self._dirty = True
+            raise
+        self.snapshots += 1
+        self.last_snapshot_ms = (time.perf_counter() - started) * 1000
+
+    def start(self):
+        """Start snapshotting in the background on the running event loop."""
+        self._stopping = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and write a final snapshot if anything changed."""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._dirty:
+            await asyncio.get_running_loop().run_in_executor(None, self.snapshot)
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.snapshot_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._dirty and not self._stopping.is_set():
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self.snapshot)
+                except Exception as e:
+                    print(f"❌ Baseline snapshot failed: {e}")
+
+    def stats(self):
+        return {
+            "services": len(self._baselines),
+            "alpha": self.alpha,
+            "dirty": self._dirty,
+            "snapshots": self.snapshots,
+            "last_snapshot_ms": round(self.last_snapshot_ms, 3)
+        }
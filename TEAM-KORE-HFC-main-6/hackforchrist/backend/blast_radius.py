@@ -1,3 +1,6 @@
+import json
+import os
+import threading
 from datetime import datetime
 
 # Static dependency map for hackathon demonstration
@@ -17,11 +20,234 @@ DEPENDENCY_MAP = {
     ]
 }
 
-def analyze_blast_radius(service_name, current_metrics):
+DEPENDENCY_GRAPH_FILE = os.getenv("DEPENDENCY_GRAPH_FILE", "")
+
+
+class DependencyGraph:
     """
-    Predicts the blast radius of a failure in service_name based on dependencies.
+    Service dependency graph with precomputed blast-radius indexes.
+
+    dependents is the reverse-adjacency index (service -> services that depend
+    ON it, with the edge type), the same shape as DEPENDENCY_MAP. closure maps
+    every service to everything downstream of it, with the minimum depth and
+    the edge that first reaches it, so a propagation lookup is a dict read.
+    Edge changes only recompute the closures of services that can reach the
+    changed edge. Edges are edited from threadpool endpoints while others read
+    the indexes, so updates and lookups go through one lock.
     """
-    # 1. Determine current state based on metrics
+
+    def __init__(self):
+        self.dependents = {}  # service -> {dependent: edge type}
+        self.upstreams = {}  # service -> set of services it depends on
+        self.closure = {}  # service -> {downstream: (depth, via, edge type)}
+        self.max_depth = {}  # service -> deepest minimum depth in its closure
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_map(cls, dependency_map):
+        """Build from the DEPENDENCY_MAP format: service -> [{"service", "type"}, ...]."""
+        graph = cls()
+        for service, deps in dependency_map.items():
+            for dep in deps:
+                graph._link(service, dep["service"], dep.get("type", "sync"))
+        graph.rebuild()
+        return graph
+
+    @classmethod
+    def from_edges(cls, edges):
+        """Build from edge docs: {"service", "dependent", "type"}."""
+        graph = cls()
+        for edge in edges:
+            graph._link(edge["service"], edge["dependent"], edge.get("type", "sync"))
+        graph.rebuild()
+        return graph
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a JSON file in either the DEPENDENCY_MAP format or as a list of edge docs."""
+        with open(path) as f:
+            data = json.load(f)
+        return cls.from_edges(data) if isinstance(data, list) else cls.from_map(data)
+
+    def services(self):
+        with self._lock:
+            return set(self.dependents) | set(self.upstreams)
+
+    def edges(self):
+        """Every edge as {"service", "dependent", "type"} docs, the db.dependencies format."""
+        with self._lock:
+            return [
+                {"service": service, "dependent": dependent, "type": dep_type}
+                for service, deps in self.dependents.items()
+                for dependent, dep_type in deps.items()
+            ]
+
+    def _link(self, service, dependent, dep_type):
+        self.dependents.setdefault(service, {})[dependent] = dep_type
+        self.upstreams.setdefault(dependent, set()).add(service)
+
+    def _trace(self, service):
+        """BFS down from service; the first visit to a node is its minimum depth."""
+        reached = {}
+        frontier = [service]
+        depth = 0
+        while frontier:
+            depth += 1
+            next_frontier = []
+            for s_name in frontier:
+                for dependent, dep_type in self.dependents.get(s_name, {}).items():
+                    if dependent not in reached:
+                        reached[dependent] = (depth, s_name, dep_type)
+                        next_frontier.append(dependent)
+            frontier = next_frontier
+        return reached
+
+    def _ancestors(self, service):
+        """service plus every service whose closure can contain it."""
+        seen = {service}
+        stack = [service]
+        while stack:
+            for upstream in self.upstreams.get(stack.pop(), ()):
+                if upstream not in seen:
+                    seen.add(upstream)
+                    stack.append(upstream)
+        return seen
+
+    def strongly_connected_components(self):
+        """Tarjan's SCCs (iterative), returned sinks first, i.e. in reverse topological order."""
+        index = {}
+        low = {}
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+
+        for root in self.services():
+            if root in index:
+                continue
+            work = [(root, iter(self.dependents.get(root, {})))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                advanced = False
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.dependents.get(child, {}))))
+                        advanced = True
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index[child])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+    def rebuild(self):
+        """
+        Full rebuild in one pass over the SCC condensation, sinks first. An
+        acyclic service's closure is merged from its dependents' finished
+        closures (min depth via any dependent, +1), so shared subtrees are
+        traced once. Services on a cycle fall back to a BFS each.
+        """
+        with self._lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        closure = {}
+        for component in self.strongly_connected_components():
+            service = component[0]
+            if len(component) > 1 or service in self.dependents.get(service, {}):
+                for member in component:
+                    closure[member] = self._trace(member)
+                continue
+
+            reached = {}
+            for dependent, dep_type in self.dependents.get(service, {}).items():
+                if dependent not in reached or reached[dependent][0] > 1:
+                    reached[dependent] = (1, service, dep_type)
+                for downstream, (depth, via, via_type) in closure[dependent].items():
+                    if downstream not in reached or reached[downstream][0] > depth + 1:
+                        reached[downstream] = (depth + 1, via, via_type)
+            closure[service] = reached
+        self.closure = closure
+        self.max_depth = {service: self._deepest(reached) for service, reached in closure.items()}
+
+    @staticmethod
+    def _deepest(reached):
+        return max(depth for depth, _, _ in reached.values()) if reached else 0
+
+    def _retrace(self, service):
+        self.closure[service] = self._trace(service)
+        self.max_depth[service] = self._deepest(self.closure[service])
+
+    def add_edge(self, service, dependent, dep_type="sync"):
+        with self._lock:
+            self._link(service, dependent, dep_type)
+            for affected in self._ancestors(service):
+                self._retrace(affected)
+            if dependent not in self.closure:
+                self._retrace(dependent)
+
+    def remove_edge(self, service, dependent):
+        with self._lock:
+            if dependent not in self.dependents.get(service, {}):
+                return
+            del self.dependents[service][dependent]
+            self.upstreams[dependent].discard(service)
+            for affected in self._ancestors(service):
+                self._retrace(affected)
+
+    def propagation(self, service):
+        """Downstream services of service as (service, depth, via, edge type), shallowest first."""
+        with self._lock:
+            reached = self.closure.get(service, {})
+            return sorted(
+                ((s, depth, via, dep_type) for s, (depth, via, dep_type) in reached.items()),
+                key=lambda p: p[1]
+            )
+
+    def summary(self):
+        """{service: (services reached, max depth)} for every service, read in one consistent pass."""
+        with self._lock:
+            return {
+                service: (len(self.closure.get(service, {})), self.max_depth.get(service, 0))
+                for service in set(self.dependents) | set(self.upstreams)
+            }
+
+
+def load_dependency_graph(edges=None):
+    """Graph from edge docs if given, else DEPENDENCY_GRAPH_FILE, else the static DEPENDENCY_MAP."""
+    if edges:
+        return DependencyGraph.from_edges(edges)
+    if DEPENDENCY_GRAPH_FILE and os.path.exists(DEPENDENCY_GRAPH_FILE):
+        return DependencyGraph.from_file(DEPENDENCY_GRAPH_FILE)
+    return DependencyGraph.from_map(DEPENDENCY_MAP)
+
+
+dependency_graph = load_dependency_graph()
+
+
+def assess_state(current_metrics):
+    """Current state, confidence and trigger signals for a service from its recent metrics."""
     # If latency is high or CPU is saturated, mark as degrading
     latency = current_metrics.get("latency_p95_ms", 0)
     cpu = current_metrics.get("mean_cpu", 0)
@@ -40,41 +266,17 @@ def analyze_blast_radius(service_name, current_metrics):
         trigger_signals.append(f"CPU saturation sustained for {round(cpu/10)} minutes")
         confidence = min(confidence, 0.72)
 
-    # 2. Trace Propagation
-    predicted_propagation = []
-    
-    def trace(s_name, current_depth=1):
-        if s_name not in DEPENDENCY_MAP:
-            return
-        
-        for dep in DEPENDENCY_MAP[s_name]:
-            risk = "High" if dep["type"] == "sync" else "Medium"
-            conf = 0.8 / (current_depth) # Confidence drops with depth
-            
-            predicted_propagation.append({
-                "service": dep["service"],
-                "risk_level": risk,
-                "confidence": round(conf, 2),
-                "expected_impact_minutes": 5 * current_depth,
-                "reason": f"{s_name} is {dep['type']} dependency"
-            })
-            
-            # Recursive trace for deeper impacts
-            trace(dep["service"], current_depth + 1)
-
-    trace(service_name)
+    return state, confidence, trigger_signals
 
-    # 3. Summary (Analytical Formula Application)
-    total_at_risk = len(set(p["service"] for p in predicted_propagation))
-    max_depth = max([p["expected_impact_minutes"]/5 for p in predicted_propagation]) if predicted_propagation else 0
-    
+def summarize_blast_radius(state, confidence, total_at_risk, max_depth):
+    """blast_radius_summary block (Analytical Formula Application)."""
     # Financial Impact Formula: Services * Avg Hourly Cost * System Confidence
     financial_exposure = total_at_risk * 415.75 * confidence if state != "Healthy" else 0
     
     # User Impact Formula: Services * Base User Traffic * propagation confidence
     users_impacted = total_at_risk * 1350 * confidence if state != "Healthy" else 0
 
-    summary = {
+    return {
         "total_services_at_risk": total_at_risk,
         "max_propagation_depth": max_depth,
         "estimated_users_affected": int(users_impacted),
@@ -82,6 +284,33 @@ def analyze_blast_radius(service_name, current_metrics):
         "cost_impact": round(financial_exposure, 2)
     }
 
+def analyze_blast_radius(service_name, current_metrics, graph=None):
+    """
+    Predicts the blast radius of a failure in service_name based on dependencies.
+    """
+    # 1. Determine current state based on metrics
+    state, confidence, trigger_signals = assess_state(current_metrics)
+
+    # 2. Trace Propagation (precomputed, one entry per downstream service at its minimum depth)
+    graph = graph or dependency_graph
+    predicted_propagation = []
+    for dep_service, depth, via, dep_type in graph.propagation(service_name):
+        risk = "High" if dep_type == "sync" else "Medium"
+        conf = 0.8 / depth  # Confidence drops with depth
+
+        predicted_propagation.append({
+            "service": dep_service,
+            "risk_level": risk,
+            "confidence": round(conf, 2),
+            "expected_impact_minutes": 5 * depth,
+            "reason": f"{via} is {dep_type} dependency"
+        })
+
+    # 3. Summary (Analytical Formula Application)
+    total_at_risk = len(set(p["service"] for p in predicted_propagation))
+    max_depth = max([p["expected_impact_minutes"]/5 for p in predicted_propagation]) if predicted_propagation else 0
+    summary = summarize_blast_radius(state, confidence, total_at_risk, max_depth)
+
     return {
         "service": service_name,
         "blast_radius": {
@@ -92,3 +321,29 @@ def analyze_blast_radius(service_name, current_metrics):
             "blast_radius_summary": summary
         }
     }
+
+def analyze_fleet_blast_radius(metrics_by_service, graph=None):
+    """
+    Blast radius for every service in the graph at once, ranked by exposure.
+    Reads the precomputed closure, so no service's subtree is re-traced.
+    Services missing from metrics_by_service are assessed with no signals (Healthy).
+    """
+    graph = graph or dependency_graph
+    ranked = []
+    for service, (reached, deepest) in graph.summary().items():
+        state, confidence, trigger_signals = assess_state(metrics_by_service.get(service, {}))
+        max_depth = float(deepest) if reached else 0
+        ranked.append({
+            "service": service,
+            "current_state": state,
+            "confidence": confidence,
+            "trigger_signals": trigger_signals,
+            "blast_radius_summary": summarize_blast_radius(state, confidence, reached, max_depth)
+        })
+
+    ranked.sort(key=lambda r: (
+        r["blast_radius_summary"]["cost_impact"],
+        r["blast_radius_summary"]["total_services_at_risk"],
+        r["blast_radius_summary"]["max_propagation_depth"]
+    ), reverse=True)
+    return ranked
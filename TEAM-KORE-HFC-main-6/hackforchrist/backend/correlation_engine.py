@@ -1,6 +1,20 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import bisect
+import threading
 import numpy as np
 
+from features import FEATURE_NAMES
+from timeseries import to_epoch
+
+# Configuration for interesting metrics
+METRICS_TO_CHECK = {
+    "mean_cpu": "CPU usage",
+    "mean_memory": "Memory usage",
+    "mean_requests": "Request rate",
+    "cpu_trend": "CPU trend",
+    "memory_trend": "Memory trend"
+}
+
 def calculate_correlation(baseline, impact, change_event):
     """
     Correlates an anomaly to a change event by comparing baseline vs impact features.
@@ -15,19 +29,10 @@ def calculate_correlation(baseline, impact, change_event):
     affected_metrics = []
     indicators = []
     
-    # Configuration for interesting metrics
-    metrics_to_check = {
-        "mean_cpu": "CPU usage",
-        "mean_memory": "Memory usage",
-        "mean_requests": "Request rate",
-        "cpu_trend": "CPU trend",
-        "memory_trend": "Memory trend"
-    }
-
     total_delta_pct = 0
     checked_count = 0
 
-    for key, label in metrics_to_check.items():
+    for key, label in METRICS_TO_CHECK.items():
         b_val = baseline.get(key, 0)
         i_val = impact.get(key, 0)
         
@@ -65,20 +70,198 @@ def calculate_correlation(baseline, impact, change_event):
     avg_delta = total_delta_pct / checked_count if checked_count > 0 else 0
     confidence = min(0.95, 0.4 + (avg_delta / 100)) # Start at 0.4 base
 
+    return {
+        "is_correlated": len(affected_metrics) > 0,
+        "confidence": round(float(confidence), 2),
+        "delay_minutes": _delay_minutes(change_event),
+        "affected_metrics": affected_metrics,
+        "indicators": indicators
+    }
+
+
+def _delay_minutes(change_event):
     # Delay estimation: Mocked for hackathon or based on timestamp diff
     delay_minutes = 0
     if change_event.get("timestamp"):
         try:
-            event_time = datetime.fromisoformat(change_event["timestamp"].replace("Z", "+00:00"))
-            now = datetime.now()
-            delay_minutes = int((now - event_time).total_seconds() / 60)
+            # Naive timestamps are UTC like the stored change events; offsets ("Z" / "+05:30") are honored
+            event_time = to_epoch(change_event["timestamp"])
+            delay_minutes = int((datetime.now(timezone.utc).timestamp() - event_time) / 60)
         except:
              delay_minutes = 5 # fallback
+    return max(1, delay_minutes)
 
-    return {
-        "is_correlated": len(affected_metrics) > 0,
-        "confidence": round(float(confidence), 2),
-        "delay_minutes": max(1, delay_minutes),
-        "affected_metrics": affected_metrics,
-        "indicators": indicators
-    }
+
+def _round_like_python(values, ndigits):
+    """
+    Element-wise round(value, ndigits) with Python's exact result. NumPy's
+    scale-and-rint agrees with it except right at a .5 tie of the scaled value,
+    so only those (and non-finite or huge values) go through round() itself.
+    """
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    with np.errstate(invalid="ignore"):
+        rounded = np.rint(scaled) / scale
+        unsure = ~(np.abs(scaled - np.floor(scaled) - 0.5) > 1e-6) | ~(np.abs(scaled) < 1e9)
+    if unsure.any():
+        rounded[unsure] = [round(v, ndigits) for v in values[unsure].tolist()]
+    return rounded
+
+
+def calculate_correlation_batch(baseline, impact, change_events, feature_names=FEATURE_NAMES):
+    """
+    calculate_correlation for many pairs at once.
+
+    baseline, impact: (n, len(feature_names)) arrays, one pair per row
+    change_events: one change_event dict for all rows, or a list of n
+    Deltas, patterns and confidence are computed column-wise over all pairs;
+    the result is a list of n dicts, each identical to what
+    calculate_correlation(baseline_row, impact_row, change_event) returns.
+    """
+    baseline = np.atleast_2d(np.asarray(baseline, dtype=np.float64))
+    impact = np.atleast_2d(np.asarray(impact, dtype=np.float64))
+    n = baseline.shape[0]
+    if isinstance(change_events, dict):
+        change_events = [change_events] * n
+
+    columns = [feature_names.index(key) for key in METRICS_TO_CHECK]
+    b_val = baseline[:, columns]
+    i_val = impact[:, columns]
+
+    delta = i_val - b_val
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta_pct = np.where(b_val != 0, (delta / np.abs(b_val)) * 100, np.where(delta > 0, 100.0, 0.0))
+    reported = np.abs(delta_pct) > 10
+
+    # Summed metric by metric, in order, to match the scalar loop exactly
+    total_delta_pct = np.zeros(n)
+    for j in range(len(columns)):
+        total_delta_pct += np.abs(delta_pct[:, j])
+    confidence = 0.4 + (total_delta_pct / len(columns) / 100)
+    # Python's min(0.95, x), including its NaN behaviour
+    confidence = np.where(confidence < 0.95, confidence, 0.95)
+
+    is_trend = np.array(["trend" in key for key in METRICS_TO_CHECK])
+    pattern = np.select(
+        [delta_pct > 15, delta_pct < -15],
+        [np.where(is_trend, "accelerated", "sustained_increase"), np.where(is_trend, "decelerated", "sustained_decrease")],
+        "stable"
+    )
+    direction = np.where(delta > 0, "increased", "decreased")
+
+    # Bulk conversion to Python objects; what is left per pair is only assembling the reported items
+    metric_names = [key.replace("mean_", "") for key in METRICS_TO_CHECK]
+    labels = list(METRICS_TO_CHECK.values())
+    b_rows = _round_like_python(b_val, 2).tolist()
+    i_rows = _round_like_python(i_val, 2).tolist()
+    pct_rows = _round_like_python(delta_pct, 1).tolist()
+    abs_pct_rows = np.abs(delta_pct).tolist()
+    pattern_rows, direction_rows = pattern.tolist(), direction.tolist()
+    confidence = _round_like_python(confidence, 2).tolist()
+    reported_rows = [[j for j, hit in enumerate(r) if hit] for r in reported.tolist()]
+
+    delays = {}
+    results = []
+    for row in range(n):
+        change_event = change_events[row]
+        b, i, pct, abs_pct = b_rows[row], i_rows[row], pct_rows[row], abs_pct_rows[row]
+        affected_metrics = [
+            {
+                "metric": metric_names[j],
+                "before": b[j],
+                "after": i[j],
+                "delta_percent": pct[j],
+                "pattern": pattern_rows[row][j]
+            }
+            for j in reported_rows[row]
+        ]
+        indicators = [
+            f"{labels[j]} {direction_rows[row][j]} {round(abs_pct[j])}% after {change_event['type']}"
+            for j in reported_rows[row]
+        ]
+
+        event_key = change_event.get("timestamp")
+        if event_key not in delays:
+            delays[event_key] = _delay_minutes(change_event)
+        results.append({
+            "is_correlated": len(affected_metrics) > 0,
+            "confidence": confidence[row],
+            "delay_minutes": delays[event_key],
+            "affected_metrics": affected_metrics,
+            "indicators": indicators
+        })
+    return results
+
+
+class ChangeIndex:
+    """
+    Per-service interval index over change events.
+
+    Every change is treated as covering a fixed impact window
+    [timestamp, timestamp + impact_window]. Because all intervals have the same
+    width, the changes overlapping [start, end] are exactly those whose
+    timestamp falls in [start - impact_window, end], so one bisect over the
+    service's sorted change times finds every candidate in O(log n + k).
+    """
+
+    def __init__(self, impact_window=timedelta(minutes=30)):
+        self.impact_window = impact_window
+        self._times = {}    # service -> sorted epoch seconds
+        self._changes = {}  # service -> change docs, parallel to _times
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add(self, change):
+        """Index a change doc (needs service and timestamp; change_id if it should be addressable)."""
+        try:
+            ts = to_epoch(change["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        change = {k: v for k, v in change.items() if k != "_id"}
+        with self._lock:
+            change_id = change.get("change_id")
+            if change_id is not None and change_id in self._by_id:
+                self._remove(change_id)
+            times = self._times.setdefault(change["service"], [])
+            changes = self._changes.setdefault(change["service"], [])
+            i = bisect.bisect_right(times, ts)
+            times.insert(i, ts)
+            changes.insert(i, change)
+            if change_id is not None:
+                self._by_id[change_id] = change
+        return True
+
+    def _remove(self, change_id):
+        change = self._by_id.pop(change_id)
+        changes = self._changes[change["service"]]
+        i = next(i for i, c in enumerate(changes) if c is change)
+        del changes[i]
+        del self._times[change["service"]][i]
+
+    def get(self, change_id):
+        return self._by_id.get(change_id)
+
+    def candidates(self, service, start, end=None):
+        """
+        Changes to service whose impact window overlaps [start, end] (datetimes
+        or epoch seconds; end defaults to start), ranked most likely cause
+        first: the latest change at or before start, then older ones, then
+        changes made during the window itself in time order.
+        Returns (change, lag_seconds) pairs, lag measured from change to start.
+        """
+        start = start if isinstance(start, (int, float)) else to_epoch(start)
+        end = start if end is None else (end if isinstance(end, (int, float)) else to_epoch(end))
+        window = self.impact_window.total_seconds()
+        with self._lock:
+            times = self._times.get(service)
+            if not times:
+                return []
+            lo = bisect.bisect_left(times, start - window)
+            hi = bisect.bisect_right(times, end)
+            found = list(zip(times[lo:hi], self._changes[service][lo:hi]))
+
+        ranked = sorted(found, key=lambda tc: (tc[0] > start, abs(start - tc[0])))
+        return [(change, start - ts) for ts, change in ranked]
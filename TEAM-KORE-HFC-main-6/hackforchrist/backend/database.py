@@ -1,138 +1,511 @@
 import os
+import asyncio
+import bisect
+import time
+import heapq
+import itertools
+import threading
 import certifi
 import uuid
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import cmp_to_key, partial
 from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ServerSelectionTimeoutError
+
+# Optional: native async driver for the async endpoints; without it they use a thread pool over pymongo
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
 
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 DB_NAME = "sentinal"
+DB_THREADS = int(os.getenv("DB_THREADS", 8))
+
+def _parse_timestamp(value):
+    """Parse a stored timestamp into a naive UTC datetime (what Mongo hands back)."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    return None
+
+RANGE_OPS = ('$gte', '$gt', '$lte', '$lt')
+
+def _compare_docs(sort, a, b):
+    """Order two docs by a [(key, descending), ...] sort spec, like a multi-key Mongo sort."""
+    for key, descending in sort:
+        x, y = a.get(key, 0), b.get(key, 0)
+        if x != y:
+            order = -1 if x < y else 1
+            return -order if descending else order
+    return 0
 
 class MockCursor:
-    def __init__(self, data):
-        self.data = data
+    """
+    Lazy cursor: nothing runs until iteration. Filter, sort, skip and limit are
+    then fused into one pass, sorting on the indexed field streams straight
+    off the TimeIndex, and other sorts with a limit use a top-k heap.
+    """
+    def __init__(self, collection, query=None, projection=None):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
         
     def sort(self, key, direction=1):
-        # direction 1 = ascending, -1 = descending
-        reverse = (direction == -1)
-        self.data.sort(key=lambda x: x.get(key, 0), reverse=reverse)
+        # direction 1 = ascending, -1 = descending; a list of (key, direction) pairs sorts on several keys
+        if isinstance(key, (list, tuple)):
+            self._sort = [(k, d == -1) for k, d in key]
+        else:
+            self._sort = [(key, direction == -1)]
+        return self
+
+    def skip(self, n):
+        self._skip = n
         return self
         
     def limit(self, n):
-        self.data = self.data[:n]
+        # Same as pymongo: limit(0) means no limit
+        self._limit = n
         return self
+
+    def _ordered(self):
+        coll = self.collection
+        sort = self._sort or []
+        on_index = len(sort) == 1 and sort[0][0] == coll.INDEX_FIELD
+        # Without a sort of their own, only the first skip + limit candidates can ever be returned
+        bound = self._skip + self._limit if self._limit and (not sort or on_index) else None
+        candidates, rest = coll._candidates(self.query, reverse=on_index and sort[0][1], bound=bound)
+        # Candidates are (timestamp, doc) pairs copied under the collection lock, so concurrent writes can't shift them
+        if rest:
+            matches = (d for ts, d in candidates if coll._matches(d, rest, ts))
+        else:
+            matches = (d for _, d in candidates)
+
+        if not sort or on_index:
+            # Candidates already come off the index in timestamp order
+            return matches
+
+        if len(sort) == 1:
+            key, reverse = sort[0]
+            sort_key = lambda x: x.get(key, 0)
+        else:
+            reverse = False
+            sort_key = cmp_to_key(partial(_compare_docs, sort))
+        if self._limit:
+            k = self._skip + self._limit
+            return iter((heapq.nlargest if reverse else heapq.nsmallest)(k, matches, key=sort_key))
+        return iter(sorted(matches, key=sort_key, reverse=reverse))
+
+    def _project(self, doc):
+        if not self.projection:
+            return doc
+        fields = self.projection
+        if isinstance(fields, (list, tuple)):
+            fields = {f: 1 for f in fields}
+        include = [f for f, on in fields.items() if on and f != '_id']
+        if include or fields.get('_id'):
+            # Inclusion projection, including an {'_id': 1}-only one
+            out = {f: doc[f] for f in include if f in doc}
+            if fields.get('_id', 1) and '_id' in doc:
+                out['_id'] = doc['_id']
+            return out
+        return {f: v for f, v in doc.items() if f not in fields}
         
     def __iter__(self):
-        return iter(self.data)
-        
-    def __list__(self):
-        return self.data
+        stop = self._skip + self._limit if self._limit else None
+        for doc in itertools.islice(self._ordered(), self._skip, stop):
+            yield self._project(doc)
+
+class TimeIndex:
+    """Documents kept sorted by parsed timestamp, for binary-search range lookups."""
+
+    def __init__(self):
+        self.keys = []
+        self.docs = []
+
+    def add(self, key, doc):
+        # bisect_right keeps insertion order among equal timestamps
+        i = bisect.bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.docs.insert(i, doc)
+
+    def remove(self, key, doc):
+        i = bisect.bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.docs[i] is doc:
+                del self.keys[i]
+                del self.docs[i]
+                return
+            i += 1
+
+    def scan(self, cond=None, reverse=False, bound=None):
+        """
+        (timestamp, doc) pairs matching a {'$gte': .., '$lte': ..} style
+        condition, in timestamp order, at most bound of them. Returned as a
+        list so the caller can iterate it after releasing the collection lock.
+        """
+        lo, hi = 0, len(self.keys)
+        for op, val in (cond or {}).items():
+            val = _parse_timestamp(val)
+            if val is None:
+                continue
+            if op == '$gte':
+                lo = max(lo, bisect.bisect_left(self.keys, val))
+            elif op == '$gt':
+                lo = max(lo, bisect.bisect_right(self.keys, val))
+            elif op == '$lte':
+                hi = min(hi, bisect.bisect_right(self.keys, val))
+            elif op == '$lt':
+                hi = min(hi, bisect.bisect_left(self.keys, val))
+        if reverse:
+            if bound is not None:
+                lo = max(lo, hi - bound)
+            return list(zip(self.keys[lo:hi], self.docs[lo:hi]))[::-1]
+        if bound is not None:
+            hi = min(hi, lo + bound)
+        return list(zip(self.keys[lo:hi], self.docs[lo:hi]))
 
 class MockCollection:
+    """
+    In-memory stand-in for a Mongo collection.
+
+    Timestamps are parsed once at insert and every document is kept in a
+    TimeIndex, both collection-wide and per service, so service equality plus
+    timestamp range queries are answered by binary search in timestamp order.
+    Every mutation holds the collection lock, and reads copy their candidates
+    under it, since the ingest flusher writes from its own thread.
+    """
+    INDEX_FIELD = 'timestamp'
+
     def __init__(self, name):
         self.name = name
         self.data = []
+        self._ts = {}  # id(doc) -> parsed timestamp
+        self._all = TimeIndex()
+        self._by_service = {}
+        self._indexes = {'_id_': {'key': [('_id', 1)]}}
+        self._unique = {}  # index name -> (fields, {key tuple: doc})
+        self._ttl = None  # expireAfterSeconds of a TTL index on the timestamp, if any
+        self._next_expiry = 0.0
+        # Reentrant: upserts and unique insert_many go through insert_one, inserts through expire
+        self._lock = threading.RLock()
+
+    def _index(self, doc):
+        ts = _parse_timestamp(doc.get(self.INDEX_FIELD))
+        if ts is None:
+            # Same fallback as before: undated docs count as "now"
+            ts = datetime.now()
+        self._ts[id(doc)] = ts
+        self._all.add(ts, doc)
+        if 'service' in doc:
+            self._by_service.setdefault(doc['service'], TimeIndex()).add(ts, doc)
+
+    def _unindex(self, doc):
+        ts = self._ts.pop(id(doc))
+        self._all.remove(ts, doc)
+        if 'service' in doc and doc['service'] in self._by_service:
+            self._by_service[doc['service']].remove(ts, doc)
+        
+    def create_index(self, keys, unique=False, name=None, **kwargs):
+        """Record an index like pymongo; unique ones are enforced on insert and update."""
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = list(keys)
+        name = name or '_'.join(f"{field}_{direction}" for field, direction in keys)
+        with self._lock:
+            if name in self._indexes:
+                return name
+
+            fields = tuple(field for field, _ in keys)
+            if unique:
+                entries = {}
+                for doc in self.data:
+                    key = self._unique_key(fields, doc)
+                    if key in entries:
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name} dup key: {key}", 11000)
+                    entries[key] = doc
+                self._unique[name] = (fields, entries)
+            if 'expireAfterSeconds' in kwargs and fields == (self.INDEX_FIELD,):
+                self._ttl = kwargs['expireAfterSeconds']
+            self._indexes[name] = dict(kwargs, key=keys, **({'unique': True} if unique else {}))
+            return name
+
+    # Like mongod's TTL monitor, expired documents are removed at most once a minute
+    TTL_MONITOR_INTERVAL = 60
+
+    def expire(self, now=None):
+        """Delete documents older than the TTL index allows; returns how many were removed."""
+        if self._ttl is None:
+            return 0
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=self._ttl)
+        return self._delete_before(cutoff)
+
+    def _delete_before(self, cutoff):
+        """Remove every document timestamped before cutoff; returns how many."""
+        with self._lock:
+            i = bisect.bisect_left(self._all.keys, cutoff)
+            if not i:
+                return 0
+            expired = self._all.docs[:i]
+            del self._all.keys[:i]
+            del self._all.docs[:i]
+            for index in self._by_service.values():
+                j = bisect.bisect_left(index.keys, cutoff)
+                del index.keys[:j]
+                del index.docs[:j]
+            gone = set()
+            for doc in expired:
+                gone.add(id(doc))
+                del self._ts[id(doc)]
+                self._remove_unique(doc)
+            self.data = [d for d in self.data if id(d) not in gone]
+            return len(expired)
+
+    def _maybe_expire(self):
+        if self._ttl is not None and time.monotonic() >= self._next_expiry:
+            self._next_expiry = time.monotonic() + self.TTL_MONITOR_INTERVAL
+            self.expire()
+
+    def index_information(self):
+        return {name: dict(info) for name, info in self._indexes.items()}
+
+    def drop_index(self, name):
+        with self._lock:
+            info = self._indexes.pop(name)
+            self._unique.pop(name, None)
+            if 'expireAfterSeconds' in info and [field for field, _ in info['key']] == [self.INDEX_FIELD]:
+                self._ttl = None
+
+    @staticmethod
+    def _unique_key(fields, doc):
+        # Like Mongo, a missing field indexes as null
+        return tuple(doc.get(field) for field in fields)
+
+    def _check_unique(self, doc, existing=None):
+        for name, (fields, entries) in self._unique.items():
+            other = entries.get(self._unique_key(fields, doc))
+            if other is not None and other is not existing:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {name} dup key: {self._unique_key(fields, doc)}",
+                    11000
+                )
+
+    def _add_unique(self, doc):
+        for fields, entries in self._unique.values():
+            entries[self._unique_key(fields, doc)] = doc
+
+    def _remove_unique(self, doc):
+        for fields, entries in self._unique.values():
+            entries.pop(self._unique_key(fields, doc), None)
         
     def insert_one(self, doc):
-        if '_id' not in doc:
-            doc['_id'] = str(uuid.uuid4())
-        self.data.append(doc)
+        with self._lock:
+            self._maybe_expire()
+            if '_id' not in doc:
+                doc['_id'] = str(uuid.uuid4())
+            if self._unique:
+                self._check_unique(doc)
+                self._add_unique(doc)
+            self.data.append(doc)
+            self._index(doc)
         return type('obj', (object,), {'inserted_id': doc['_id']})
+
+    def insert_many(self, docs, ordered=True):
+        docs = list(docs)
+        with self._lock:
+            self._maybe_expire()
+            if self._unique:
+                return self._insert_many_unique(docs, ordered)
+            inserted_ids = []
+            for doc in docs:
+                if '_id' not in doc:
+                    doc['_id'] = str(uuid.uuid4())
+                inserted_ids.append(doc['_id'])
+                self._index(doc)
+            self.data.extend(docs)
+        return type('obj', (object,), {'inserted_ids': inserted_ids})
+
+    def _insert_many_unique(self, docs, ordered):
+        """insert_many with unique indexes: duplicates become writeErrors, as in pymongo."""
+        inserted_ids = []
+        errors = []
+        for i, doc in enumerate(docs):
+            try:
+                self.insert_one(doc)
+            except DuplicateKeyError as e:
+                errors.append({'index': i, 'code': 11000, 'errmsg': str(e), 'op': doc})
+                if ordered:
+                    break
+                continue
+            inserted_ids.append(doc['_id'])
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(inserted_ids)})
+        return type('obj', (object,), {'inserted_ids': inserted_ids})
+
+    def _matches(self, doc, query, ts=None):
+        for k, v in query.items():
+            if k == self.INDEX_FIELD:
+                doc_val = self._ts[id(doc)] if ts is None else ts
+            else:
+                doc_val = doc.get(k)
+            if isinstance(v, dict):
+                for op, val in v.items():
+                    if k == self.INDEX_FIELD and op in RANGE_OPS:
+                        val = _parse_timestamp(val)
+                    try:
+                        if op == '$gte' and not doc_val >= val:
+                            return False
+                        if op == '$gt' and not doc_val > val:
+                            return False
+                        if op == '$lte' and not doc_val <= val:
+                            return False
+                        if op == '$lt' and not doc_val < val:
+                            return False
+                        if op == '$in' and doc_val not in val:
+                            return False
+                        if op == '$ne' and doc_val == val:
+                            return False
+                    except TypeError:
+                        return False
+            elif k == self.INDEX_FIELD:
+                if doc_val != _parse_timestamp(v):
+                    return False
+            elif doc_val != v:
+                return False
+        return True
+
+    def _candidates(self, query, reverse=False, bound=None):
+        """
+        Narrow the scan with the time index; returns ((timestamp, doc) pairs in
+        timestamp order, remaining query). bound caps the pairs copied when no
+        other condition is left to filter them.
+        """
+        rest = dict(query)
+        service = rest.get('service')
+        if isinstance(service, str):
+            rest.pop('service')
+
+        cond = rest.get(self.INDEX_FIELD)
+        if isinstance(cond, dict) and cond and all(op in RANGE_OPS for op in cond):
+            rest.pop(self.INDEX_FIELD)
+        elif cond is not None and not isinstance(cond, dict) and _parse_timestamp(cond) is not None:
+            # Exact timestamp: a one-key range on the index
+            rest.pop(self.INDEX_FIELD)
+            cond = {'$gte': cond, '$lte': cond}
+        else:
+            cond = None
+
+        with self._lock:
+            index = self._by_service.get(service) if isinstance(service, str) else self._all
+            if index is None:
+                return [], rest
+            return index.scan(cond, reverse, None if rest else bound), rest
         
-    def find_one(self, query=None):
-        query = query or {}
-        for doc in self.data:
-            match = True
-            for k, v in query.items():
-                # Handle simple $gte
-                if isinstance(v, dict):
-                    for op, val in v.items():
-                        if op == '$gte':
-                            # Ensure types match for comparison (datetime vs str)
-                            # In main.py timestamp is datetime object when stored, 
-                            # but filtering might start with datetime
-                            doc_val = doc.get(k)
-                            if isinstance(doc_val, str):
-                                try:
-                                    doc_val = datetime.fromisoformat(doc_val.replace('Z', '+00:00'))
-                                except:
-                                    pass
-                            elif doc_val is None:
-                                doc_val = datetime.now()  # fallback for testing
-                            if not (doc_val >= val):
-                                match = False
-                        elif op == '$lte':
-                            doc_val = doc.get(k)
-                            if isinstance(doc_val, str):
-                                try:
-                                    doc_val = datetime.fromisoformat(doc_val.replace('Z', '+00:00'))
-                                except:
-                                    pass
-                            elif doc_val is None:
-                                doc_val = datetime.now()  # fallback for testing
-                            if not (doc_val <= val):
-                                match = False
-                        # Add other ops if needed
-                elif doc.get(k) != v:
-                    match = False
-            if match:
-                return doc
+    def find_one(self, query=None, projection=None):
+        for doc in MockCursor(self, query, projection).limit(1):
+            return doc
         return None
         
-    def find(self, query=None):
-        query = query or {}
-        results = []
-        for doc in self.data:
-            match = True
-            for k, v in query.items():
-                # Handle simple $gte
-                if isinstance(v, dict):
-                    for op, val in v.items():
-                        if op == '$gte':
-                            # Ensure types match for comparison (datetime vs str)
-                            # In main.py timestamp is datetime object when stored, 
-                            # but filtering might start with datetime
-                            doc_val = doc.get(k)
-                            if isinstance(doc_val, str):
-                                try:
-                                    doc_val = datetime.fromisoformat(doc_val.replace('Z', '+00:00'))
-                                except:
-                                    pass
-                            elif doc_val is None:
-                                doc_val = datetime.now()  # fallback for testing
-                            if not (doc_val >= val):
-                                match = False
-                        elif op == '$lte':
-                            doc_val = doc.get(k)
-                            if isinstance(doc_val, str):
-                                try:
-                                    doc_val = datetime.fromisoformat(doc_val.replace('Z', '+00:00'))
-                                except:
-                                    pass
-                            elif doc_val is None:
-                                doc_val = datetime.now()  # fallback for testing
-                            if not (doc_val <= val):
-                                match = False
-                        # Add other ops if needed
-                elif doc.get(k) != v:
-                    match = False
-            if match:
-                results.append(doc)
-        return MockCursor(results)
+    def find(self, query=None, projection=None):
+        return MockCursor(self, query, projection)
     
-    def update_one(self, query, update):
+    def delete_one(self, query):
+        with self._lock:
+            candidates, rest = self._candidates(query or {})
+            doc = next((d for ts, d in candidates if self._matches(d, rest, ts)), None)
+            if doc is None:
+                return type('obj', (object,), {'deleted_count': 0})
+            self._unindex(doc)
+            self._remove_unique(doc)
+            del self.data[next(i for i, d in enumerate(self.data) if d is doc)]
+        return type('obj', (object,), {'deleted_count': 1})
+
+    def delete_many(self, query):
         query = query or {}
+        cond = query.get(self.INDEX_FIELD)
+        if list(query) == [self.INDEX_FIELD] and isinstance(cond, dict) and list(cond) == ['$lt']:
+            # Retention deletes: a prefix of the time index
+            cutoff = _parse_timestamp(cond['$lt'])
+            return type('obj', (object,), {'deleted_count': self._delete_before(cutoff)})
+        with self._lock:
+            candidates, rest = self._candidates(query)
+            docs = [d for ts, d in candidates if self._matches(d, rest, ts)]
+            for doc in docs:
+                self._unindex(doc)
+                self._remove_unique(doc)
+            gone = set(map(id, docs))
+            self.data = [d for d in self.data if id(d) not in gone]
+        return type('obj', (object,), {'deleted_count': len(docs)})
+
+    def distinct(self, key, query=None):
+        if key == 'service' and not query:
+            # Straight off the per-service index
+            with self._lock:
+                return [service for service, index in self._by_service.items() if index.keys]
+        values = []
+        seen = set()
+        for doc in MockCursor(self, query):
+            value = doc.get(key)
+            if value is not None and value not in seen:
+                seen.add(value)
+                values.append(value)
+        return values
+
+    def count_documents(self, query):
+        return sum(1 for _ in MockCursor(self, query))
+    
+    def update_one(self, query, update, upsert=False):
+        with self._lock:
+            return self._update_one(query, update, upsert)
+
+    def _update_one(self, query, update, upsert):
         update_data = update.get('$set', {})
-        for doc in self.data:
-            match = True
-            for k, v in query.items():
-                if doc.get(k) != v:
-                    match = False
-                    break
-            if match:
-                doc.update(update_data)
-                return type('obj', (object,), {'matched_count': 1, 'modified_count': 1})
-        return type('obj', (object,), {'matched_count': 0, 'modified_count': 0})
+        candidates, rest = self._candidates(query or {})
+        doc = next((d for ts, d in candidates if self._matches(d, rest, ts)), None)
+        if doc is None:
+            if not upsert:
+                return type('obj', (object,), {'matched_count': 0, 'modified_count': 0, 'upserted_id': None})
+            # Like Mongo: the query's equality fields plus the $set fields
+            new_doc = {k: v for k, v in (query or {}).items() if not isinstance(v, dict) and not k.startswith('$')}
+            new_doc.update(update_data)
+            inserted_id = self.insert_one(new_doc).inserted_id
+            return type('obj', (object,), {'matched_count': 0, 'modified_count': 0, 'upserted_id': inserted_id})
+
+        rekey = any(field in update_data for fields, _ in self._unique.values() for field in fields)
+        if rekey:
+            self._check_unique(dict(doc, **update_data), existing=doc)
+            self._remove_unique(doc)
+
+        reindex = self.INDEX_FIELD in update_data or 'service' in update_data
+        if reindex:
+            self._unindex(doc)
+        doc.update(update_data)
+        if reindex:
+            self._index(doc)
+        if rekey:
+            self._add_unique(doc)
+        return type('obj', (object,), {'matched_count': 1, 'modified_count': 1, 'upserted_id': None})
+
+    def bulk_write(self, requests, ordered=True):
+        """UpdateOne requests (all the rollup builder sends), applied in order under one lock."""
+        matched = modified = upserted = 0
+        with self._lock:
+            for op in requests:
+                result = self._update_one(op._filter, op._doc, op._upsert)
+                matched += result.matched_count
+                modified += result.modified_count
+                upserted += result.upserted_id is not None
+        return type('obj', (object,), {'matched_count': matched, 'modified_count': modified, 'upserted_count': upserted})
 
 class MockDatabase:
     def __init__(self):
@@ -144,6 +517,113 @@ class MockDatabase:
             self.collections[name] = MockCollection(name)
         return self.collections[name]
 
+# Indexes the backend's queries rely on, created (idempotently) at startup
+INDEXES = {
+    # Per-service time range reads, newest first (scans, correlation windows); fleet-wide time
+    # ranges for the rollup builder, which also deletes expired raw points once they are rolled up
+    "metrics": [([("service", 1), ("timestamp", -1)], {}), ([("timestamp", 1)], {})],
+    # /alerts and /changes sort by timestamp
+    "alerts": [([("timestamp", -1)], {})],
+    "changes": [([("timestamp", -1)], {})],
+    # Every auth call looks a user up by email
+    "users": [([("email", 1)], {"unique": True})],
+}
+
+def _drop_stale_ttl(collection, keys, options):
+    """Drop a TTL index left on the same keys by an older version; it would clash with a plain one and keep deleting."""
+    if 'expireAfterSeconds' in options:
+        return
+    for name, info in collection.index_information().items():
+        if [tuple(key) for key in info['key']] == list(keys) and 'expireAfterSeconds' in info:
+            collection.drop_index(name)
+            print(f"✅ Dropped TTL index {name} on {collection.name}")
+
+def ensure_indexes(database, indexes=INDEXES):
+    """Create any missing indexes; a failure (e.g. existing duplicate emails) is logged, not fatal."""
+    created = 0
+    for collection, specs in indexes.items():
+        for keys, options in specs:
+            try:
+                _drop_stale_ttl(getattr(database, collection), keys, options)
+                getattr(database, collection).create_index(keys, **options)
+                created += 1
+            except Exception as e:
+                print(f"⚠️  Could not create index {keys} on {collection}: {e}")
+    return created
+
+class AsyncCursor:
+    """Motor-style cursor over a synchronous one: chain sort/skip/limit, then await to_list()."""
+    def __init__(self, collection, cursor):
+        self._collection = collection
+        self._cursor = cursor
+
+    def sort(self, key, direction=1):
+        self._cursor.sort(key, direction)
+        return self
+
+    def skip(self, n):
+        self._cursor.skip(n)
+        return self
+
+    def limit(self, n):
+        self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length=None):
+        # Iterating is what actually queries, so it runs off the event loop too
+        return await self._collection._run(lambda: list(itertools.islice(self._cursor, length)))
+
+class AsyncCollection:
+    """
+    Awaitable wrapper over a synchronous collection (pymongo or MockCollection)
+    with the motor calls the async endpoints use. Calls are dispatched to the
+    given thread pool, or run inline when there is none: the in-memory mock
+    never blocks, so handing it to threads would only add overhead.
+    """
+    def __init__(self, collection, executor=None):
+        self._collection = collection
+        self._executor = executor
+
+    async def _run(self, fn, *args, **kwargs):
+        if self._executor is None:
+            return fn(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self, self._collection.find(*args, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        return await self._run(self._collection.find_one, *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return await self._run(self._collection.insert_one, *args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs):
+        return await self._run(self._collection.insert_many, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await self._run(self._collection.update_one, *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        return await self._run(self._collection.delete_one, *args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await self._run(self._collection.count_documents, *args, **kwargs)
+
+class AsyncDatabase:
+    """Async facade over a synchronous database, one AsyncCollection per collection."""
+    def __init__(self, database, executor=None):
+        self._database = database
+        self._executor = executor
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name not in self._collections:
+            self._collections[name] = AsyncCollection(getattr(self._database, name), self._executor)
+        return self._collections[name]
+
 # Try to connect to real Mongo, fall back to Mock
 try:
     print(f"🔄 Attempting connection to MongoDB...")
@@ -154,3 +634,12 @@ try:
 except Exception as e:
     print(f"⚠️  Connection failed: {e}")
     db = MockDatabase()
+
+# Async access for async endpoints: motor if installed, else pymongo on a bounded thread pool
+if isinstance(db, MockDatabase):
+    async_db = AsyncDatabase(db)
+elif AsyncIOMotorClient is not None:
+    async_db = AsyncIOMotorClient(MONGODB_URI, serverSelectionTimeoutMS=10000, tlsCAFile=certifi.where())[DB_NAME]
+    print("✅ Using motor for async database access")
+else:
+    async_db = AsyncDatabase(db, ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="mongo"))
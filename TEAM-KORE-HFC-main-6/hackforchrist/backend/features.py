@@ -0,0 +1,343 @@
+import bisect
+import threading
+from collections import deque
+from typing import List, Dict
+
+import numpy as np
+
+from timeseries import to_epoch
+
+# Features expected by the pickled models, in column order
+FEATURE_NAMES = [
+    'mean_cpu', 'std_cpu', 'min_cpu', 'max_cpu', 'delta_cpu', 'cpu_trend',
+    'cpu_volatility', 'mean_memory', 'std_memory', 'memory_trend',
+    'mean_requests', 'request_spike_count', 'throughput_delta', 'cost_delta',
+    'unit_economics_ratio'
+]
+
+def extract_features(metrics_list: List[Dict]):
+    """Calculate 15 features expected by the models from a list of metrics objects."""
+    if not metrics_list:
+        return None
+    
+    cpus = [m['cpu_percent'] for m in metrics_list]
+    mems = [m['memory_mb'] for m in metrics_list]
+    reqs = [m['request_count'] for m in metrics_list]
+    return extract_features_from_columns(cpus, mems, reqs)
+
+def extract_features_from_columns(cpus, mems, reqs):
+    """Same as extract_features, but over column sequences (lists or ring buffer views)."""
+    if len(cpus) == 0:
+        return None
+    
+    # Dummy cost calculation: CPU influence + Memory influence
+    costs = [c * 0.05 + m * 0.01 for c, m in zip(cpus, mems)]
+    
+    # Basic Stats
+    mean_cpu = np.mean(cpus)
+    std_cpu = np.std(cpus)
+    min_cpu = np.min(cpus)
+    max_cpu = np.max(cpus)
+    delta_cpu = cpus[-1] - cpus[0]
+    
+    # Trend: Simple slope
+    x = np.arange(len(cpus))
+    cpu_trend = np.polyfit(x, cpus, 1)[0] if len(cpus) > 1 else 0
+    cpu_volatility = std_cpu
+    
+    mean_memory = np.mean(mems)
+    std_memory = np.std(mems)
+    memory_trend = np.polyfit(x, mems, 1)[0] if len(mems) > 1 else 0
+    
+    mean_requests = np.mean(reqs)
+    # Spike: requests > 1.5 * mean
+    request_spike_count = sum(1 for r in reqs if r > mean_requests * 1.5)
+    throughput_delta = reqs[-1] - reqs[0]
+    
+    cost_delta = costs[-1] - costs[0]
+    # Unit econ: requests per dollar
+    unit_economics_ratio = sum(reqs) / sum(costs) if sum(costs) > 0 else 0
+    
+    features = [
+        mean_cpu, std_cpu, min_cpu, max_cpu, delta_cpu, cpu_trend,
+        cpu_volatility, mean_memory, std_memory, memory_trend,
+        mean_requests, request_spike_count, throughput_delta, cost_delta,
+        unit_economics_ratio
+    ]
+    
+    return np.array(features).reshape(1, -1)
+
+def _slopes(y):
+    """Least-squares slope of y against 0..T-1 along the last axis, in closed form."""
+    T = y.shape[-1]
+    if T < 2:
+        return np.zeros(y.shape[:-1])
+    x = np.arange(T) - (T - 1) / 2.0
+    return ((y - y.mean(axis=-1, keepdims=True)) * x).sum(axis=-1) / (x * x).sum()
+
+def extract_features_batch(cpus, mems, reqs):
+    """
+    Vectorized extract_features over many windows at once.
+
+    cpus, mems and reqs are arrays of shape (services, windows, samples) (any
+    leading shape works) and the result has shape (services, windows, 15) in
+    FEATURE_NAMES order. Each window is read in the same order extract_features
+    would get it. The two trends use the closed-form slope in place of
+    np.polyfit, so they equal extract_features' only within float tolerance
+    (~1e-12 relative); every other feature matches exactly. Sums stay
+    sequential (cumsum) so unit_economics_ratio matches sum() exactly.
+    """
+    cpus = np.asarray(cpus, dtype=np.float64)
+    mems = np.asarray(mems, dtype=np.float64)
+    reqs = np.asarray(reqs, dtype=np.float64)
+
+    # Dummy cost calculation: CPU influence + Memory influence
+    costs = cpus * 0.05 + mems * 0.01
+
+    mean_cpu = cpus.mean(axis=-1)
+    std_cpu = cpus.std(axis=-1)
+    mean_requests = reqs.mean(axis=-1)
+    total_reqs = np.cumsum(reqs, axis=-1)[..., -1]
+    total_costs = np.cumsum(costs, axis=-1)[..., -1]
+    has_cost = total_costs > 0
+
+    features = [
+        mean_cpu,
+        std_cpu,
+        cpus.min(axis=-1),
+        cpus.max(axis=-1),
+        cpus[..., -1] - cpus[..., 0],
+        _slopes(cpus),
+        std_cpu,  # cpu_volatility
+        mems.mean(axis=-1),
+        mems.std(axis=-1),
+        _slopes(mems),
+        mean_requests,
+        (reqs > mean_requests[..., None] * 1.5).sum(axis=-1),
+        reqs[..., -1] - reqs[..., 0],
+        costs[..., -1] - costs[..., 0],
+        np.where(has_cost, total_reqs / np.where(has_cost, total_costs, 1.0), 0.0)
+    ]
+    return np.stack(features, axis=-1).astype(np.float64)
+
+
+class _RunningStats:
+    """Welford mean/variance over a sliding window, plus the sums a regression slope needs."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Slope sums are taken over y - offset (the first value seen) to limit cancellation
+        self.offset = None
+        self.sum_y = 0.0
+        self.sum_xy = 0.0  # x is the position in the window, 0 = oldest
+
+    def push(self, y):
+        if self.offset is None:
+            self.offset = y
+        self.sum_xy += self.n * (y - self.offset)
+        self.sum_y += y - self.offset
+        self.n += 1
+        delta = y - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (y - self.mean)
+
+    def pop_oldest(self, y):
+        self.n -= 1
+        self.sum_y -= y - self.offset
+        # Everyone left moves down one position
+        self.sum_xy -= self.sum_y
+        if self.n == 0:
+            self.mean = self.m2 = self.sum_y = self.sum_xy = 0.0
+            self.offset = None
+            return
+        delta = y - self.mean
+        self.mean -= delta / self.n
+        self.m2 -= delta * (y - self.mean)
+
+    def std(self):
+        return float(np.sqrt(max(self.m2, 0.0) / self.n)) if self.n else 0.0
+
+    def slope(self):
+        n = self.n
+        if n < 2:
+            return 0.0
+        sum_x = n * (n - 1) / 2.0
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6.0
+        return (n * self.sum_xy - sum_x * self.sum_y) / (n * sum_xx - sum_x * sum_x)
+
+
+class IncrementalFeatures:
+    """
+    The 15 FEATURE_NAMES maintained in O(1) per point over a sliding window.
+
+    push() adds a point in timestamp order and evicts the oldest once the
+    window is full; a backfilled point is slotted into place and the window
+    rebuilt, so it always holds the newest points like the DB query would.
+    evict_before() drops points older than a cutoff. Min/max
+    use monotonic deques, the spike count a sorted list of request counts.
+    The running sums are rebuilt from the window every resync_every evictions
+    so floating point drift can't build up; results match extract_features to
+    rounding (slopes to ~1e-9 relative).
+    """
+
+    def __init__(self, window=50, resync_every=1000):
+        self.window = window
+        self.resync_every = resync_every
+        self._reset()
+
+    def _reset(self):
+        self.points = deque()  # (ts, cpu, mem, req, cost)
+        self.cpu = _RunningStats()
+        self.mem = _RunningStats()
+        self.sum_reqs = 0.0
+        self.sum_costs = 0.0
+        self._sorted_reqs = []
+        self._min_cpu = deque()  # (seq, value), increasing values
+        self._max_cpu = deque()  # (seq, value), decreasing values
+        self._seq = 0  # seq of the next point pushed
+        self._head = 0  # seq of the oldest point in the window
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self.points)
+
+    def push(self, ts, cpu, mem, req):
+        if self.points and ts < self.points[-1][0]:
+            self._insert(ts, cpu, mem, req)
+            return
+
+        # Dummy cost calculation: CPU influence + Memory influence
+        cost = cpu * 0.05 + mem * 0.01
+        self.points.append((ts, cpu, mem, req, cost))
+        self.cpu.push(cpu)
+        self.mem.push(mem)
+        self.sum_reqs += req
+        self.sum_costs += cost
+        bisect.insort(self._sorted_reqs, req)
+
+        while self._min_cpu and self._min_cpu[-1][1] >= cpu:
+            self._min_cpu.pop()
+        self._min_cpu.append((self._seq, cpu))
+        while self._max_cpu and self._max_cpu[-1][1] <= cpu:
+            self._max_cpu.pop()
+        self._max_cpu.append((self._seq, cpu))
+        self._seq += 1
+
+        if len(self.points) > self.window:
+            self._evict_oldest()
+
+    def evict_before(self, ts):
+        while self.points and self.points[0][0] < ts:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        _, cpu, mem, req, cost = self.points.popleft()
+        self.cpu.pop_oldest(cpu)
+        self.mem.pop_oldest(mem)
+        self.sum_reqs -= req
+        self.sum_costs -= cost
+        del self._sorted_reqs[bisect.bisect_left(self._sorted_reqs, req)]
+
+        if self._min_cpu[0][0] == self._head:
+            self._min_cpu.popleft()
+        if self._max_cpu[0][0] == self._head:
+            self._max_cpu.popleft()
+        self._head += 1
+
+        self._evictions += 1
+        if self._evictions >= self.resync_every:
+            self._resync()
+
+    def _insert(self, ts, cpu, mem, req):
+        """Out-of-order point: place it by timestamp and rebuild the window (O(window))."""
+        if len(self.points) >= self.window and ts < self.points[0][0]:
+            return  # Older than everything in a full window
+        points = [p[:4] for p in self.points]
+        points.insert(bisect.bisect_right([p[0] for p in points], ts), (ts, cpu, mem, req))
+        self._rebuild(points[-self.window:])
+
+    def _resync(self):
+        self._rebuild([p[:4] for p in self.points])
+
+    def _rebuild(self, points):
+        self._reset()
+        for ts, cpu, mem, req in points:
+            self.push(ts, cpu, mem, req)
+
+    def vector(self, newest_first=True):
+        """
+        Current features as a (1, 15) row, or None if the window is empty.
+
+        With newest_first the window is read newest point first, which is the
+        order scan_now feeds extract_features, so deltas and trends flip sign.
+        """
+        n = len(self.points)
+        if n == 0:
+            return None
+        first, last = self.points[0], self.points[-1]
+        sign = -1.0 if newest_first else 1.0
+
+        mean_requests = self.sum_reqs / n
+        spikes = n - bisect.bisect_right(self._sorted_reqs, mean_requests * 1.5)
+        std_cpu = self.cpu.std()
+
+        features = [
+            self.cpu.mean,
+            std_cpu,
+            self._min_cpu[0][1],
+            self._max_cpu[0][1],
+            sign * (last[1] - first[1]),
+            sign * self.cpu.slope(),
+            std_cpu,  # cpu_volatility
+            self.mem.mean,
+            self.mem.std(),
+            sign * self.mem.slope(),
+            mean_requests,
+            spikes,
+            sign * (last[3] - first[3]),
+            sign * (last[4] - first[4]),
+            self.sum_reqs / self.sum_costs if self.sum_costs > 0 else 0
+        ]
+        return np.array(features, dtype=np.float64).reshape(1, -1)
+
+
+class FeatureTracker:
+    """IncrementalFeatures per service, fed at ingest so scans never touch storage."""
+
+    def __init__(self, window=50):
+        self.window = window
+        self._features = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _get(self, service):
+        if service not in self._features:
+            with self._lock:
+                if service not in self._features:
+                    self._locks[service] = threading.Lock()
+                    self._features[service] = IncrementalFeatures(self.window)
+        return self._features[service], self._locks[service]
+
+    def update(self, doc):
+        """Fold one ingested metric point into its service's window."""
+        ts = to_epoch(doc['timestamp'])
+        features, lock = self._get(doc['service'])
+        with lock:
+            features.push(ts, float(doc['cpu_percent']), float(doc['memory_mb']), float(doc['request_count']))
+
+    def services(self):
+        return list(self._features)
+
+    def vector(self, service, since=None, min_points=1):
+        """Feature row for a service after dropping points older than since, or None."""
+        if service not in self._features:
+            return None
+        features, lock = self._get(service)
+        with lock:
+            if since is not None:
+                features.evict_before(since)
+            if len(features) < min_points:
+                return None
+            return features.vector()
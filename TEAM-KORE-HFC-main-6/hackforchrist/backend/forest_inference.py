@@ -0,0 +1,276 @@
+import os
+
+import numpy as np
+
+# Set COMPILED_INFERENCE=0 to score with the unpickled sklearn models instead
+COMPILED_INFERENCE = os.getenv("COMPILED_INFERENCE", "1") != "0"
+
+# Bump when the on-disk layout changes so stale caches are recompiled
+CACHE_VERSION = 1
+
+
+def _flatten_trees(trees, feature_maps=None):
+    """
+    Concatenate fitted sklearn Tree objects into flat node arrays.
+
+    Children are rewritten as global node indexes, interleaved as
+    children[2 * node + went_right], and leaves point back at themselves with
+    an infinite threshold, so a fixed number of traversal steps (the deepest
+    tree's depth) lands every row on its leaf.
+    """
+    features, thresholds, children = [], [], []
+    roots = []
+    offset = 0
+    for i, tree in enumerate(trees):
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        own = np.arange(offset, offset + n, dtype=np.int64)
+
+        feature = np.where(is_leaf, 0, tree.feature).astype(np.int64)
+        if feature_maps is not None:
+            # Tree was fit on a column subset; map back to input columns
+            feature = np.asarray(feature_maps[i], dtype=np.int64)[feature]
+
+        features.append(feature)
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        children.append(np.stack([
+            np.where(is_leaf, own, tree.children_left + offset),
+            np.where(is_leaf, own, tree.children_right + offset)
+        ], axis=1).ravel())
+        roots.append(offset)
+        offset += n
+
+    return {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'children': np.concatenate(children),
+        'roots': np.asarray(roots, dtype=np.int64),
+        'max_depth': np.int64(max(tree.max_depth for tree in trees)),
+    }
+
+
+class _CompiledForest:
+    """Vectorized traversal shared by the compiled models."""
+
+    # Rows traversed together; keeps the (rows, trees) node block cache-sized
+    CHUNK_ROWS = 256
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature'].astype(np.intp)
+        self.threshold = arrays['threshold']
+        self.children = arrays['children'].astype(np.intp)
+        self.roots = arrays['roots'].astype(np.intp)
+        self.max_depth = int(arrays['max_depth'])
+        self.n_features_in_ = int(arrays['n_features_in'])
+
+    def _check_X(self, X):
+        # Trees split on float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n, {self.n_features_in_})")
+        return X.astype(np.float64)
+
+    def apply(self, X):
+        """Leaf node (global index) reached by every row in every tree, shape (n_rows, n_trees)."""
+        X = self._check_X(X)
+        n_features = X.shape[1]
+        leaves = np.empty((X.shape[0], len(self.roots)), dtype=np.intp)
+        for start in range(0, X.shape[0], self.CHUNK_ROWS):
+            block = X[start:start + self.CHUNK_ROWS]
+            values = block.ravel()
+            row_base = (np.arange(block.shape[0]) * n_features)[:, None]
+            nodes = np.broadcast_to(self.roots, (block.shape[0], len(self.roots))).copy()
+            for _ in range(self.max_depth):
+                went_right = ~(values[row_base + self.feature[nodes]] <= self.threshold[nodes])
+                nodes = self.children[2 * nodes + went_right]
+            leaves[start:start + self.CHUNK_ROWS] = nodes
+        return leaves
+
+    def _sum_over_trees(self, leaves, leaf_values):
+        """
+        Per-row sum of leaf_values over trees, added tree by tree in order like
+        sklearn does so the floating point result is identical.
+        """
+        out = np.empty((leaves.shape[0],) + leaf_values.shape[1:], dtype=np.float64)
+        for start in range(0, leaves.shape[0], self.CHUNK_ROWS):
+            gathered = leaf_values[leaves[start:start + self.CHUNK_ROWS]]
+            out[start:start + self.CHUNK_ROWS] = np.cumsum(gathered, axis=1)[:, -1]
+        return out
+
+
+class CompiledIsolationForest(_CompiledForest):
+    """
+    Array-compiled IsolationForest. Each leaf stores its path-length
+    contribution (depth + average path length of its samples - 1) so scoring
+    is one gather per tree; results match the sklearn model exactly.
+    """
+
+    KIND = 'isolation_forest'
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.leaf_path_length = arrays['leaf_path_length']
+        self.normalizer = float(arrays['normalizer'])
+        self.offset_ = float(arrays['offset'])
+
+    @classmethod
+    def from_sklearn(cls, model):
+        from sklearn.ensemble._iforest import _average_path_length
+
+        trees = [est.tree_ for est in model.estimators_]
+        feature_maps = None
+        if model._max_features != model.n_features_in_:
+            feature_maps = model.estimators_features_
+        arrays = _flatten_trees(trees, feature_maps)
+        # Same expression sklearn evaluates per leaf in _compute_score_samples
+        arrays['leaf_path_length'] = np.concatenate([
+            depths + avg - 1.0
+            for depths, avg in zip(model._decision_path_lengths, model._average_path_length_per_tree)
+        ])
+        arrays['normalizer'] = np.float64(len(model.estimators_) * _average_path_length([model._max_samples])[0])
+        arrays['offset'] = np.float64(model.offset_)
+        arrays['n_features_in'] = np.int64(model.n_features_in_)
+        return cls(arrays)
+
+    def save(self, path, source_stamp):
+        np.savez(
+            path,
+            kind=np.array(self.KIND),
+            version=np.int64(CACHE_VERSION),
+            source_stamp=np.asarray(source_stamp, dtype=np.float64),
+            n_features_in=np.int64(self.n_features_in_),
+            max_depth=np.int64(self.max_depth),
+            normalizer=np.float64(self.normalizer),
+            offset=np.float64(self.offset_),
+            feature=self.feature, threshold=self.threshold, children=self.children,
+            roots=self.roots, leaf_path_length=self.leaf_path_length
+        )
+
+    def score_samples(self, X):
+        depths = self._sum_over_trees(self.apply(X), self.leaf_path_length)
+        return -(2 ** (-depths / self.normalizer))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+class CompiledRandomForest(_CompiledForest):
+    """
+    Array-compiled RandomForestClassifier. Leaves store the per-tree class
+    distribution already normalized, as DecisionTreeClassifier.predict_proba
+    would return it; results match the sklearn model exactly.
+    """
+
+    KIND = 'random_forest'
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.leaf_proba = arrays['leaf_proba']
+        self.classes_ = arrays['classes']
+
+    @classmethod
+    def from_sklearn(cls, model):
+        if model.n_outputs_ != 1:
+            raise ValueError("Only single-output forests can be compiled")
+        trees = [est.tree_ for est in model.estimators_]
+        arrays = _flatten_trees(trees)
+        leaf_proba = []
+        for tree in trees:
+            proba = tree.value[:, 0, :model.n_classes_]
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            leaf_proba.append(proba / normalizer)
+        arrays['leaf_proba'] = np.concatenate(leaf_proba)
+        arrays['classes'] = np.asarray(model.classes_)
+        arrays['n_features_in'] = np.int64(model.n_features_in_)
+        return cls(arrays)
+
+    def save(self, path, source_stamp):
+        classes = self.classes_
+        if classes.dtype == object:
+            classes = classes.astype(str)
+        np.savez(
+            path,
+            kind=np.array(self.KIND),
+            version=np.int64(CACHE_VERSION),
+            source_stamp=np.asarray(source_stamp, dtype=np.float64),
+            n_features_in=np.int64(self.n_features_in_),
+            max_depth=np.int64(self.max_depth),
+            feature=self.feature, threshold=self.threshold, children=self.children,
+            roots=self.roots, leaf_proba=self.leaf_proba, classes=classes
+        )
+
+    def predict_proba(self, X):
+        proba = self._sum_over_trees(self.apply(X), self.leaf_proba)
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+COMPILED_TYPES = {cls.KIND: cls for cls in (CompiledIsolationForest, CompiledRandomForest)}
+
+
+def _source_stamp(pkl_path):
+    stat = os.stat(pkl_path)
+    return [stat.st_mtime, stat.st_size]
+
+
+def _load_cache(cache_path, kind, stamp):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable model cache {cache_path}: {e}")
+        return None
+    if (str(arrays['kind']) != kind or int(arrays['version']) != CACHE_VERSION
+            or list(arrays['source_stamp']) != stamp):
+        return None
+    return COMPILED_TYPES[kind](arrays)
+
+
+def load_compiled(pkl_path, kind):
+    """
+    Compiled model for a pickled forest. A <pkl>.compiled.npz cache next to
+    the pickle is used while it matches the pickle's mtime and size, which
+    skips unpickling (and importing sklearn) entirely; otherwise the pickle
+    is compiled and the cache rewritten.
+    """
+    cache_path = pkl_path + '.compiled.npz'
+    stamp = _source_stamp(pkl_path)
+    model = _load_cache(cache_path, kind, stamp)
+    if model is not None:
+        return model
+
+    import joblib
+    model = COMPILED_TYPES[kind].from_sklearn(joblib.load(pkl_path))
+    try:
+        tmp_path = cache_path + '.tmp.npz'
+        model.save(tmp_path, stamp)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not write model cache {cache_path}: {e}")
+    return model
+
+
+def load_models(models_dir, compiled=COMPILED_INFERENCE):
+    """
+    (isolation_forest, random_forest) from the pickles in models_dir, compiled
+    unless disabled. Falls back to the sklearn models if compiling fails.
+    """
+    iso_path = os.path.join(models_dir, "isolation_forest_model.pkl")
+    rf_path = os.path.join(models_dir, "random_forest_model.pkl")
+    if compiled:
+        try:
+            return load_compiled(iso_path, 'isolation_forest'), load_compiled(rf_path, 'random_forest')
+        except Exception as e:
+            print(f"⚠️ Compiled inference unavailable, using sklearn models: {e}")
+
+    import joblib
+    return joblib.load(iso_path), joblib.load(rf_path)
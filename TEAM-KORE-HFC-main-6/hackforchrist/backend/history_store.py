@@ -0,0 +1,379 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Optional: without it (non-POSIX) the store assumes a single writing process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".ndjson"
+INDEX_SUFFIX = ".idx.npz"
+WRITER_PREFIX = "writer-"
+LOCK_FILE = ".writer.lock"
+
+
+def _claim_slot(root):
+    """
+    Lock the first writer slot no other process holds: root itself, then
+    root/writer-1, writer-2, ... Returns (slot directory, lock fd).
+    """
+    os.makedirs(root, exist_ok=True)
+    if fcntl is None:
+        return root, None
+    slot = 0
+    while True:
+        directory = root if slot == 0 else os.path.join(root, f"{WRITER_PREFIX}{slot}")
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return directory, fd
+        except OSError:
+            os.close(fd)
+            slot += 1
+
+
+class HistoryStore:
+    """
+    Append-only, segment-based log of per-service results.
+
+    Each record is one NDJSON line {"ts", "service", "result"} appended to the
+    active segment with a single write, so readers only ever see complete
+    lines. Segments have exactly one writer: each store locks a writer slot
+    (the directory itself, else the first free writer-N subdirectory), so
+    with several worker processes every process indexes, seals and applies
+    retention to its own segments only, and reads see that process's history;
+    a restarted worker picks up a free slot's existing segments. Once a
+    segment passes segment_max_bytes it is sealed: its per-service
+    (ts, offset, length) index is written next to it, so reopening the store
+    never re-parses sealed segments, and a new segment is started. Sealing also applies retention:
+    segments entirely older than retention_seconds are deleted and the one
+    straddling the cutoff is rewritten without its expired records; call
+    compact() periodically so retention also runs when nothing seals.
+
+    The in-memory index maps service -> sorted timestamps and record locations,
+    so a time-range read only seeks to and parses the matching lines.
+    """
+
+    def __init__(self, directory, segment_max_bytes=4 * 1024 * 1024, retention_seconds=7 * 24 * 3600):
+        self.directory, self._slot_fd = _claim_slot(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.retention_seconds = retention_seconds
+
+        self._lock = threading.Lock()
+        # service -> ([ts, ...], [(segment, offset, length), ...]), both sorted by ts
+        self._index = {}
+        # segment -> {"min_ts", "max_ts", "size", "records"}
+        self._segments = {}
+        self._latest = None
+        self._active = None
+        self._fd = None
+
+        self._load()
+
+    # -- paths ---------------------------------------------------------------
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment:06d}{SEGMENT_SUFFIX}")
+
+    def _index_path(self, segment):
+        return self._segment_path(segment)[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+    def _list_segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(segments)
+
+    # -- loading -------------------------------------------------------------
+
+    def _load(self):
+        segments = self._list_segments()
+        for segment in segments:
+            if segment != segments[-1] and self._load_index(segment):
+                continue
+            self._scan_segment(segment)
+
+        self._active = segments[-1] if segments else 1
+        self._open_active()
+
+        latest_segment = max(self._segments, default=None)
+        if latest_segment is not None:
+            newest = max(
+                ((ts[-1], locs[-1]) for ts, locs in self._index.values() if locs and locs[-1][0] == latest_segment),
+                default=None
+            )
+            if newest is not None:
+                self._latest = self._read(newest[1])
+
+    def _load_index(self, segment):
+        path = self._index_path(segment)
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                services = data["services"].tolist()
+                service_ids = data["service_ids"]
+                ts = data["ts"]
+                offsets = data["offsets"]
+                lengths = data["lengths"]
+        except Exception as e:
+            print(f"⚠️ Rebuilding unreadable history index {path}: {e}")
+            return False
+
+        for service_id, t, offset, length in zip(service_ids.tolist(), ts.tolist(), offsets.tolist(), lengths.tolist()):
+            self._add_to_index(services[service_id], t, (segment, offset, length))
+        self._segments[segment] = {
+            "min_ts": float(ts.min()) if len(ts) else None,
+            "max_ts": float(ts.max()) if len(ts) else None,
+            "size": os.path.getsize(self._segment_path(segment)),
+            "records": len(ts)
+        }
+        return True
+
+    def _scan_segment(self, segment):
+        """Index a segment by reading it; drops a torn (unterminated) last line left by a crash."""
+        path = self._segment_path(segment)
+        with open(path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            with open(path, "r+b") as f:
+                f.truncate(end)
+
+        info = {"min_ts": None, "max_ts": None, "size": end, "records": 0}
+        offset = 0
+        while offset < end:
+            next_offset = data.index(b"\n", offset) + 1
+            try:
+                record = json.loads(data[offset:next_offset])
+            except ValueError:
+                offset = next_offset
+                continue
+            self._add_to_index(record["service"], record["ts"], (segment, offset, next_offset - offset))
+            self._track_segment(info, record["ts"])
+            offset = next_offset
+        self._segments[segment] = info
+
+    # -- index ---------------------------------------------------------------
+
+    def _add_to_index(self, service, ts, location):
+        times, locations = self._index.setdefault(service, ([], []))
+        if not times or ts >= times[-1]:
+            times.append(ts)
+            locations.append(location)
+        else:
+            i = bisect.bisect_right(times, ts)
+            times.insert(i, ts)
+            locations.insert(i, location)
+
+    @staticmethod
+    def _track_segment(info, ts):
+        info["min_ts"] = ts if info["min_ts"] is None else min(info["min_ts"], ts)
+        info["max_ts"] = ts if info["max_ts"] is None else max(info["max_ts"], ts)
+        info["records"] += 1
+
+    def _drop_from_index(self, segment):
+        for service in list(self._index):
+            times, locations = self._index[service]
+            keep = [i for i, loc in enumerate(locations) if loc[0] != segment]
+            if len(keep) == len(locations):
+                continue
+            if keep:
+                self._index[service] = ([times[i] for i in keep], [locations[i] for i in keep])
+            else:
+                del self._index[service]
+
+    def _write_index(self, segment):
+        services = sorted(self._index)
+        service_ids, ts, offsets, lengths = [], [], [], []
+        for service_id, service in enumerate(services):
+            times, locations = self._index[service]
+            for t, (seg, offset, length) in zip(times, locations):
+                if seg == segment:
+                    service_ids.append(service_id)
+                    ts.append(t)
+                    offsets.append(offset)
+                    lengths.append(length)
+
+        tmp_path = self._index_path(segment) + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            services=np.array(services, dtype=str),
+            service_ids=np.array(service_ids, dtype=np.int32),
+            ts=np.array(ts, dtype=np.float64),
+            offsets=np.array(offsets, dtype=np.int64),
+            lengths=np.array(lengths, dtype=np.int64)
+        )
+        os.replace(tmp_path, self._index_path(segment))
+
+    # -- writing -------------------------------------------------------------
+
+    def _open_active(self):
+        self._fd = os.open(self._segment_path(self._active), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segments.setdefault(self._active, {"min_ts": None, "max_ts": None, "size": 0, "records": 0})
+
+    def append(self, service, result, ts=None):
+        """Record one result for a service (ts defaults to now, epoch seconds)."""
+        self.append_many([(service, result)], ts)
+
+    def append_many(self, entries, ts=None):
+        """Record several (service, result) pairs in one write."""
+        ts = time.time() if ts is None else ts
+        lines = [
+            json.dumps({"ts": ts, "service": service, "result": result}, separators=(",", ":")).encode() + b"\n"
+            for service, result in entries
+        ]
+        if not lines:
+            return
+
+        with self._lock:
+            if self._fd is None:
+                # Closed at shutdown; reopen if the process keeps writing
+                self._open_active()
+            info = self._segments[self._active]
+            if info["size"] and info["size"] + sum(map(len, lines)) > self.segment_max_bytes:
+                self._seal()
+                info = self._segments[self._active]
+
+            os.write(self._fd, b"".join(lines))
+            offset = info["size"]
+            for (service, _), line in zip(entries, lines):
+                self._add_to_index(service, ts, (self._active, offset, len(line)))
+                self._track_segment(info, ts)
+                offset += len(line)
+            info["size"] = offset
+            self._latest = {"ts": ts, "service": entries[-1][0], "result": entries[-1][1]}
+
+    def _seal(self):
+        """Index and close the active segment, start the next one and apply retention."""
+        self._write_index(self._active)
+        os.close(self._fd)
+        self._active += 1
+        self._open_active()
+        self._apply_retention()
+
+    def _apply_retention(self, now=None):
+        cutoff = (time.time() if now is None else now) - self.retention_seconds
+        for segment in sorted(self._segments):
+            info = self._segments[segment]
+            if segment == self._active or info["min_ts"] is None or info["min_ts"] >= cutoff:
+                break
+            if info["max_ts"] < cutoff:
+                self._drop_segment(segment)
+                continue
+            self._rewrite_segment(segment, cutoff)
+            break
+
+    def _drop_segment(self, segment):
+        self._drop_from_index(segment)
+        del self._segments[segment]
+        for path in (self._segment_path(segment), self._index_path(segment)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _rewrite_segment(self, segment, cutoff):
+        """Atomically replace a sealed segment with only its records at or after cutoff."""
+        kept = []
+        for service, (times, locations) in self._index.items():
+            for t, loc in zip(times, locations):
+                if loc[0] == segment and t >= cutoff:
+                    kept.append((loc[1], loc[2], service, t))
+        kept.sort()
+
+        path = self._segment_path(segment)
+        tmp_path = path + ".tmp"
+        with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            for offset, length, _, _ in kept:
+                src.seek(offset)
+                dst.write(src.read(length))
+        os.replace(tmp_path, path)
+
+        self._drop_from_index(segment)
+        info = {"min_ts": None, "max_ts": None, "size": 0, "records": 0}
+        for _, length, service, t in kept:
+            self._add_to_index(service, t, (segment, info["size"], length))
+            self._track_segment(info, t)
+            info["size"] += length
+        self._segments[segment] = info
+        self._write_index(segment)
+
+    def compact(self, now=None):
+        """Apply retention now rather than waiting for the next segment to seal."""
+        with self._lock:
+            self._apply_retention(now)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    # -- reading -------------------------------------------------------------
+
+    def _read(self, location):
+        segment, offset, length = location
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def latest(self, service=None):
+        """Newest record overall, or for one service; None if there is none."""
+        if service is None:
+            return self._latest
+        with self._lock:
+            entry = self._index.get(service)
+            return self._read(entry[1][-1]) if entry else None
+
+    def range(self, service, since=None, until=None, limit=None, newest_first=True):
+        """Records for a service with since <= ts <= until (epoch seconds), newest first by default."""
+        # Reads hold the lock too: sealing may rewrite or delete old segments
+        with self._lock:
+            entry = self._index.get(service)
+            if not entry:
+                return []
+            times, locations = entry
+            lo = 0 if since is None else bisect.bisect_left(times, since)
+            hi = len(times) if until is None else bisect.bisect_right(times, until)
+            selected = locations[lo:hi]
+            if newest_first:
+                selected = selected[::-1]
+            if limit is not None:
+                selected = selected[:limit]
+
+            records = []
+            handles = {}
+            try:
+                for segment, offset, length in selected:
+                    f = handles.get(segment)
+                    if f is None:
+                        f = handles[segment] = open(self._segment_path(segment), "rb")
+                    f.seek(offset)
+                    records.append(json.loads(f.read(length)))
+            finally:
+                for f in handles.values():
+                    f.close()
+            return records
+
+    def services(self):
+        return list(self._index)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "segments": len(self._segments),
+                "active_segment": self._active,
+                "bytes": sum(info["size"] for info in self._segments.values()),
+                "records": sum(info["records"] for info in self._segments.values()),
+                "services": len(self._index),
+                "retention_seconds": self.retention_seconds
+            }
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.fromiter(samples, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(values.max()), 3)
+    }
+
+
+class InferenceBatcher:
+    """
+    Coalesces concurrent single-row inference requests into one model call.
+
+    Callers await submit(row) from the event loop. The first row to arrive
+    opens a batch that is scored after max_wait seconds, or as soon as
+    max_batch rows are waiting, whichever comes first. score_fn(X) gets the
+    stacked (n, n_features) matrix and must return one result per row; it runs
+    in the default executor so the loop stays free while the models work.
+    """
+
+    def __init__(self, score_fn, max_batch=64, max_wait=0.005, sample_size=1000):
+        self.score_fn = score_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+        # Counters and recent samples for sizing the window
+        self.requests = 0
+        self.rows_scored = 0
+        self.batches = 0
+        self.errors = 0
+        self._batch_sizes = Counter()
+        self._waits_ms = deque(maxlen=sample_size)
+        self._score_ms = deque(maxlen=sample_size)
+
+    async def submit(self, row):
+        """Score one feature row (shape (n_features,) or (1, n_features)); returns its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((np.asarray(row, dtype=np.float64).reshape(-1), future, time.perf_counter()))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._dispatch(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch, loop)
+        return await future
+
+    def _dispatch(self, loop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # submit() dispatches as soon as max_batch rows are waiting, so a batch never holds more
+        batch, self._pending = self._pending, []
+        if batch:
+            task = loop.create_task(self._score(loop, batch))
+            # Keep a reference until done so the task isn't garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, loop, batch):
+        started = time.perf_counter()
+        for _, _, queued_at in batch:
+            self._waits_ms.append((started - queued_at) * 1000)
+        self.batches += 1
+        self.rows_scored += len(batch)
+        self._batch_sizes[len(batch)] += 1
+
+        X = np.vstack([row for row, _, _ in batch])
+        try:
+            results = await loop.run_in_executor(None, self.score_fn, X)
+        except Exception as e:
+            print(f"❌ Inference batch failed ({len(batch)} rows): {e}")
+            self.errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._score_ms.append((time.perf_counter() - started) * 1000)
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "pending": len(self._pending),
+            "requests": self.requests,
+            "rows_scored": self.rows_scored,
+            "batches": self.batches,
+            "errors": self.errors,
+            "avg_batch_size": round(self.rows_scored / self.batches, 3) if self.batches else 0.0,
+            "batch_size_histogram": {str(size): n for size, n in sorted(self._batch_sizes.items())},
+            "queue_wait_ms": _percentiles(self._waits_ms),
+            "score_ms": _percentiles(self._score_ms)
+        }
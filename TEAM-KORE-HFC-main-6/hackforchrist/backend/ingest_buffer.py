@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class IngestBuffer:
+    """
+    In-process write-behind queue for metric points.
+
+    Producers call put_many() (from the event loop or a threadpool worker) and
+    get an answer as soon as the points are queued. A background task started
+    with start() writes them out through write_fn in batches of at most
+    batch_size, either as soon as a full batch is waiting or every
+    flush_interval seconds. write_fn must return the number of docs it wrote.
+    """
+
+    def __init__(self, write_fn, batch_size=500, flush_interval=1.0, max_queue=100000):
+        self.write_fn = write_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+
+        # Counters for sizing the buffer
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def put_many(self, docs):
+        """Queue docs for writing. Returns how many were accepted; the rest are dropped."""
+        with self._lock:
+            room = self.max_queue - len(self._queue)
+            accepted = docs[:max(room, 0)]
+            self._queue.extend(accepted)
+            self.enqueued += len(accepted)
+            self.dropped += len(docs) - len(accepted)
+            full_batch = len(self._queue) >= self.batch_size
+
+        if full_batch and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return len(accepted)
+
+    def put(self, doc):
+        return self.put_many([doc]) == 1
+
+    def depth(self):
+        return len(self._queue)
+
+    def start(self):
+        """Start the background flusher on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and drain whatever is still queued."""
+        self._stopping = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+        while self._queue:
+            if not await self._flush_once():
+                # Writes are failing; don't spin on shutdown
+                with self._lock:
+                    self.dropped += len(self._queue)
+                    self._queue.clear()
+        self._loop = None
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            while self._queue and not self._stopping:
+                if not await self._flush_once():
+                    break
+
+    async def _flush_once(self):
+        """Write one batch. Returns False if the write failed."""
+        with self._lock:
+            n = min(self.batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(n)]
+        if not batch:
+            return True
+
+        started = time.perf_counter()
+        try:
+            written = await asyncio.get_running_loop().run_in_executor(None, self.write_fn, batch)
+        except Exception as e:
+            print(f"❌ Ingest flush failed ({len(batch)} points): {e}")
+            self.flush_errors += 1
+            self._requeue(batch)
+            return False
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flush_count += 1
+        self.flushed += written
+        self.dropped += len(batch) - written
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+        return True
+
+    def _requeue(self, batch):
+        # Put a failed batch back at the head so it is retried first,
+        # keeping only as much as still fits
+        with self._lock:
+            room = max(self.max_queue - len(self._queue), 0)
+            keep = batch[:room]
+            self._queue.extendleft(reversed(keep))
+            self.dropped += len(batch) - len(keep)
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flush_count": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 3)
+        }
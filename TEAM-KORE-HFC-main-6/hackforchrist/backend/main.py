@@ -1,40 +1,109 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 from typing import List, Optional, Dict
-from pydantic import BaseModel, EmailStr
-from database import db
-from correlation_engine import calculate_correlation
-from blast_radius import analyze_blast_radius
+from pydantic import BaseModel, EmailStr, ValidationError
+from database import db, async_db, ensure_indexes
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from correlation_engine import calculate_correlation, calculate_correlation_batch, ChangeIndex
+from blast_radius import analyze_blast_radius, analyze_fleet_blast_radius, load_dependency_graph
+from ingest_buffer import IngestBuffer
+from timeseries import TimeSeriesStore, to_epoch
+from prometheus import prometheus, CPU_METRIC, LATENCY_METRIC, TRAFFIC_METRIC, MEMORY_METRIC
+from features import FEATURE_NAMES, FeatureTracker, extract_features, extract_features_batch
+from forest_inference import load_models
+from inference_batcher import InferenceBatcher
+from history_store import HistoryStore
+from snapshot_cache import JsonSnapshot, dumps as snapshot_dumps
+from baseline_store import BaselineStore
+from scan_scheduler import ScanScheduler
+from rollups import RollupBuilder, ROLLUP_INDEXES
 import requests
 import os
-import joblib
+import asyncio
+from functools import partial
 import numpy as np
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict
 import hashlib
 import secrets
+import threading
+import time
 
 app = FastAPI(title="Sentinal Backend")
 
+@app.on_event("startup")
+def create_indexes():
+    created = ensure_indexes(db) + ensure_indexes(db, ROLLUP_INDEXES)
+    print(f"✅ Ensured {created} database indexes")
+
 # Load ML Models
 ML_DATA_DIR = os.path.join(os.path.dirname(__file__), "../data")
 ML_INPUT_DIR = os.path.join(ML_DATA_DIR, "input")
 ML_OUTPUT_DIR = os.path.join(ML_DATA_DIR, "output")
 ML_RESULTS_FILE = os.path.join(ML_OUTPUT_DIR, "ml_results.json")
 BLAST_RADIUS_FILE = os.path.join(ML_OUTPUT_DIR, "blast_radius_results.json")
+FLEET_SCAN_FILE = os.path.join(ML_OUTPUT_DIR, "fleet_scan_results.json")
+FLEET_BLAST_RADIUS_FILE = os.path.join(ML_OUTPUT_DIR, "fleet_blast_radius_results.json")
+ML_HISTORY_DIR = os.getenv("ML_HISTORY_DIR", os.path.join(ML_OUTPUT_DIR, "history"))
 
 # Ensure directories exist
 os.makedirs(ML_INPUT_DIR, exist_ok=True)
 os.makedirs(ML_OUTPUT_DIR, exist_ok=True)
 
+# Append-only history of every scan / blast-radius result; the *_FILE snapshots above only hold the latest
+HISTORY_RETENTION_SECONDS = float(os.getenv("HISTORY_RETENTION_DAYS", 7)) * 24 * 3600
+HISTORY_SEGMENT_BYTES = int(os.getenv("HISTORY_SEGMENT_BYTES", 4 * 1024 * 1024))
+scan_history = HistoryStore(
+    os.path.join(ML_HISTORY_DIR, "scan"),
+    segment_max_bytes=HISTORY_SEGMENT_BYTES, retention_seconds=HISTORY_RETENTION_SECONDS
+)
+blast_radius_history = HistoryStore(
+    os.path.join(ML_HISTORY_DIR, "blast_radius"),
+    segment_max_bytes=HISTORY_SEGMENT_BYTES, retention_seconds=HISTORY_RETENTION_SECONDS
+)
+HISTORY_STORES = {"scan": scan_history, "blast_radius": blast_radius_history}
+# Retention otherwise only runs when a segment seals, which a quiet store may never do
+HISTORY_COMPACT_INTERVAL = float(os.getenv("HISTORY_COMPACT_INTERVAL_SECONDS", 3600))
+
+# Latest results as pre-serialized bytes for the polled endpoints
+ml_results_snapshot = JsonSnapshot(ML_RESULTS_FILE)
+blast_radius_snapshot = JsonSnapshot(BLAST_RADIUS_FILE)
+_latest_scan = scan_history.latest()
+if _latest_scan is not None:
+    ml_results_snapshot.publish(_latest_scan["result"])
+
+def _write_json_atomic(path, payload):
+    """Write a JSON snapshot via a temp file and rename, so readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(snapshot_dumps(payload))
+    os.replace(tmp_path, path)
+
+async def _in_thread(fn, *args):
+    """Run blocking file or network work on the default executor instead of the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, partial(fn, *args))
+
+# Serializes file write + publish so a snapshot never ends up holding an older result than its file
+_snapshot_write_lock = threading.Lock()
+
+def _publish_latest(payload, path, snapshot):
+    """Write and publish a result as the latest (blocking; run off the loop)."""
+    with _snapshot_write_lock:
+        _write_json_atomic(path, payload)
+        snapshot.publish(payload)
+
+def _save_latest(history, service, payload, path, snapshot):
+    """Record a result in history, then write and publish it as the latest (blocking; run off the loop)."""
+    history.append(service, payload)
+    _publish_latest(payload, path, snapshot)
+
 # Load ML Models
 try:
     # Models are in the root of 'cat'
     ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
-    iso_forest = joblib.load(os.path.join(ROOT_DIR, "isolation_forest_model.pkl"))
-    rand_forest = joblib.load(os.path.join(ROOT_DIR, "random_forest_model.pkl"))
+    iso_forest, rand_forest = load_models(ROOT_DIR)
     print("✅ ML Models loaded successfully")
 except Exception as e:
     print(f"❌ Error loading ML models: {e}")
@@ -43,12 +112,17 @@ except Exception as e:
 
     rand_forest = None
 
-# Global state for Baseline tracking (Hackathon simplified)
-BASELINE_FEATURES = None
+# Per-service EWMA baselines that scans are correlated against, persisted across restarts
+baseline_store = BaselineStore(
+    os.getenv("BASELINE_FILE", os.path.join(ML_OUTPUT_DIR, "baselines.json")),
+    alpha=float(os.getenv("BASELINE_EWMA_ALPHA", 0.3)),
+    snapshot_interval=float(os.getenv("BASELINE_SNAPSHOT_INTERVAL", 30))
+)
 MOCK_CHANGE_EVENT = {
     "type": "deployment",
     "service": "payment-api",
-    "timestamp": datetime.now().isoformat()
+    # Local time with its offset, so it reads the same as stored UTC change times
+    "timestamp": datetime.now().astimezone().isoformat()
 }
 
 # Enable CORS
@@ -77,6 +151,11 @@ class ChangeEvent(BaseModel):
     description: str
     version: str
 
+class DependencyEdge(BaseModel):
+    service: str
+    dependent: str  # service that depends ON `service`
+    type: str = "sync"
+
 # Authentication Models
 class UserRegister(BaseModel):
     full_name: str
@@ -115,11 +194,236 @@ def ingest_metrics(payload: MetricPayload):
         except:
              pass 
     
-    # Store in MongoDB
-    db.metrics.insert_one(data)
+    # Queue for MongoDB; the background flusher writes it out
+    if not ingest_buffer.put(data):
+        raise HTTPException(status_code=503, detail="Ingest buffer full, retry later")
+    if isinstance(data['timestamp'], datetime):
+        _track_points([data])
     
     return {"status": "success"}
 
+# Bulk ingest: points are validated and queued in chunks of this size so a long NDJSON
+# stream never has to sit in memory all at once
+INGEST_BATCH_CHUNK = int(os.getenv("INGEST_BATCH_CHUNK", 1000))
+
+def _normalize_batch(indexed_points, now=None, ts_cache=None):
+    """Validate (index, raw_dict) pairs and normalize their timestamps.
+
+    Returns (docs, doc_indexes, rejects). Points in one scrape usually share a
+    timestamp, so parsed timestamps are memoized in ts_cache for the whole batch.
+    """
+    now = now or datetime.utcnow()
+    ts_cache = ts_cache if ts_cache is not None else {}
+    docs = []
+    doc_indexes = []
+    rejects = []
+    for index, raw in indexed_points:
+        try:
+            data = MetricPayload.parse_obj(raw).dict()
+        except ValidationError as e:
+            rejects.append({"index": index, "error": e.errors()})
+            continue
+
+        ts = data.get('timestamp')
+        if not ts:
+            data['timestamp'] = now
+        else:
+            parsed = ts_cache.get(ts)
+            if parsed is None:
+                try:
+                    parsed = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+                except ValueError:
+                    rejects.append({"index": index, "error": f"Invalid timestamp: {ts}"})
+                    continue
+                ts_cache[ts] = parsed
+            data['timestamp'] = parsed
+        docs.append(data)
+        doc_indexes.append(index)
+    return docs, doc_indexes, rejects
+
+def _write_batch(docs):
+    """insert_many a batch of points for the ingest buffer, returning how many were written."""
+    try:
+        result = db.metrics.insert_many(docs, ordered=False)
+        written = len(result.inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        print(f"⚠️  {len(errors)} metric points failed to write: {errors[:1]}")
+        written = len(docs) - len(errors)
+    # Late points land in minutes that are already rolled up; have those re-rolled
+    rollup_builder.note_written(docs)
+    return written
+
+# Write-behind buffer: ingest endpoints return once points are queued
+ingest_buffer = IngestBuffer(
+    _write_batch,
+    batch_size=int(os.getenv("INGEST_FLUSH_BATCH_SIZE", 500)),
+    flush_interval=float(os.getenv("INGEST_FLUSH_INTERVAL", 1.0)),
+    max_queue=int(os.getenv("INGEST_MAX_QUEUE", 100000))
+)
+
+# Hot read path for recent windows; Mongo (or the mock DB) stays the durable store.
+# Default capacity covers an hour of 5s points per service.
+metric_store = TimeSeriesStore(capacity=int(os.getenv("METRIC_RING_CAPACITY", 720)))
+
+# Scan features maintained incrementally over the same 50-point window scan_now uses
+feature_tracker = FeatureTracker(window=50)
+
+def _track_points(docs):
+    """Feed accepted points to the in-memory read paths."""
+    metric_store.append_many(docs)
+    for doc in docs:
+        feature_tracker.update(doc)
+
+def _warm_feature_tracker(hours=24):
+    """Seed each service's feature window with its newest points from the DB."""
+    end_time = datetime.now()
+    start_time = end_time - timedelta(hours=hours)
+    warmed = 0
+    for service in _db_services():
+        points = db.metrics.find(
+            {"service": service, "timestamp": {"$gte": start_time, "$lte": end_time}},
+            {"_id": 0, "service": 1, "timestamp": 1, "cpu_percent": 1, "memory_mb": 1, "request_count": 1}
+        ).sort("timestamp", -1).limit(feature_tracker.window)
+        for doc in points:
+            feature_tracker.update(doc)
+        warmed += 1
+    return warmed
+
+@app.on_event("startup")
+async def warm_feature_tracker():
+    try:
+        warmed = await _in_thread(_warm_feature_tracker)
+        print(f"✅ Warmed scan features for {warmed} services")
+    except Exception as e:
+        print(f"⚠️ Feature warm-up failed, scans will read MongoDB until windows fill: {e}")
+
+@app.on_event("startup")
+async def start_ingest_buffer():
+    ingest_buffer.start()
+
+@app.on_event("shutdown")
+async def drain_ingest_buffer():
+    await ingest_buffer.stop()
+    print(f"✅ Ingest buffer drained ({ingest_buffer.flushed} points written)")
+
+@app.on_event("startup")
+async def start_baseline_store():
+    loaded = baseline_store.load()
+    if loaded:
+        print(f"✅ Loaded baselines for {loaded} services")
+    baseline_store.start()
+
+@app.on_event("shutdown")
+async def snapshot_baselines():
+    # Background scans update baselines and history, so let them finish before the final snapshot
+    await scan_scheduler.stop()
+    await baseline_store.stop()
+
+async def _compact_history():
+    """Apply history retention at startup and then every HISTORY_COMPACT_INTERVAL seconds."""
+    while True:
+        for kind, store in HISTORY_STORES.items():
+            try:
+                await _in_thread(store.compact)
+            except Exception as e:
+                print(f"❌ History compaction ({kind}) failed: {e}")
+        await asyncio.sleep(HISTORY_COMPACT_INTERVAL)
+
+_history_compaction = {"task": None}
+
+@app.on_event("startup")
+async def start_history_compaction():
+    _history_compaction["task"] = asyncio.get_running_loop().create_task(_compact_history())
+
+@app.on_event("shutdown")
+async def close_history():
+    task = _history_compaction["task"]
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        _history_compaction["task"] = None
+    for store in HISTORY_STORES.values():
+        store.close()
+
+@app.get("/ingest/stats")
+def ingest_stats():
+    """Queue depth, flush latency and dropped-point counters for the ingest buffer."""
+    return ingest_buffer.stats()
+
+@app.post("/ingest/metrics/batch")
+async def ingest_metrics_batch(request: Request):
+    """
+    Bulk metric ingest. Accepts either a JSON array of MetricPayload objects or
+    a streamed NDJSON body (Content-Type: application/x-ndjson), one point per line.
+    Invalid points are reported individually and do not fail the batch.
+    Accepted points are queued on the ingest buffer and written in the background.
+    """
+    now = datetime.utcnow()
+    ts_cache = {}
+    accepted = 0
+    received = 0
+    rejects = []
+    pending = []
+
+    def flush():
+        nonlocal accepted, pending
+        docs, doc_indexes, bad = _normalize_batch(pending, now, ts_cache)
+        queued = ingest_buffer.put_many(docs)
+        _track_points(docs[:queued])
+        accepted += queued
+        rejects.extend(bad)
+        rejects.extend({"index": i, "error": "Ingest buffer full"} for i in doc_indexes[queued:])
+        pending = []
+
+    content_type = request.headers.get('content-type', '')
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        remainder = b''
+
+        def take_line(line):
+            nonlocal received
+            line = line.strip()
+            if not line:
+                return
+            index = received
+            received += 1
+            try:
+                pending.append((index, json.loads(line)))
+            except ValueError:
+                rejects.append({"index": index, "error": "Invalid JSON line"})
+
+        async for chunk in request.stream():
+            lines = (remainder + chunk).split(b'\n')
+            remainder = lines.pop()
+            for line in lines:
+                take_line(line)
+            if len(pending) >= INGEST_BATCH_CHUNK:
+                flush()
+        take_line(remainder)
+    else:
+        try:
+            points = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON stream")
+        if not isinstance(points, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of metric points")
+
+        received = len(points)
+        for index, raw in enumerate(points):
+            pending.append((index, raw))
+            if len(pending) >= INGEST_BATCH_CHUNK:
+                flush()
+    flush()
+
+    rejects.sort(key=lambda r: r["index"])
+    return {
+        "status": "success" if not rejects else "partial",
+        "received": received,
+        "accepted": accepted,
+        "rejected": len(rejects),
+        "rejects": rejects
+    }
+
 @app.post("/ingest/change")
 async def ingest_change(event: ChangeEvent, background_tasks: BackgroundTasks):
     data = event.dict()
@@ -132,7 +436,8 @@ async def ingest_change(event: ChangeEvent, background_tasks: BackgroundTasks):
             pass
 
     # Store change event
-    db.changes.insert_one(data)
+    await async_db.changes.insert_one(data)
+    change_index.add(data)
     
     # Trigger correlation analysis (async)
     # We wait a bit or schedule it? For simplicity, we can trigger it immediately 
@@ -144,43 +449,125 @@ async def ingest_change(event: ChangeEvent, background_tasks: BackgroundTasks):
     
     return {"status": "success", "change_id": data.get('change_id')}
 
-@app.get("/metrics/recent")
-def get_recent_metrics(service: str, window: int = 300):
-    # Query Prometheus
-    # We want: cpu, memory, latency, traffic
-    # PromQL: service_cpu_usage_percent{service="<service>"}
-    
-    end_time = datetime.now()
-    start_time = end_time - timedelta(seconds=window)
-    
-    # Helper to query range
-    def query_prom(metric_name):
-        try:
-            response = requests.get(
-                'http://localhost:9090/api/v1/query_range',
-                params={
-                    'query': f'{metric_name}{{service="{service}"}}',
-                    'start': start_time.timestamp(),
-                    'end': end_time.timestamp(),
-                    'step': '5s'
-                },
-                timeout=2
+# Each change is assumed to be able to cause impact for this long after it lands
+CHANGE_IMPACT_WINDOW = timedelta(minutes=float(os.getenv("CHANGE_IMPACT_WINDOW_MINUTES", 30)))
+change_index = ChangeIndex(CHANGE_IMPACT_WINDOW)
+
+@app.on_event("startup")
+def load_changes():
+    for change in db.changes.find({}, {"_id": 0}):
+        change_index.add(change)
+    if len(change_index):
+        print(f"✅ Indexed {len(change_index)} change events")
+
+def _change_event_payload(change):
+    """The change_event block of a scan / correlation payload for a stored change."""
+    ts = change.get("timestamp")
+    if isinstance(ts, datetime) and ts.tzinfo is None:
+        # Stored (and Mongo-returned) change times are naive UTC; say so in the payload
+        ts = ts.replace(tzinfo=timezone.utc)
+    event = {
+        "type": change.get("type", "deployment"),
+        "timestamp": ts.isoformat() if isinstance(ts, datetime) else ts
+    }
+    for key in ("change_id", "version", "description"):
+        if change.get(key) is not None:
+            event[key] = change[key]
+    return event
+
+def _window_features(service, start, end):
+    """Feature vector over the newest 50 points of a service in [start, end), or None if under 5 points."""
+    metrics = list(db.metrics.find({
+        "service": service,
+        "timestamp": {"$gte": start, "$lt": end}
+    }, METRIC_FIELDS_PROJECTION).sort("timestamp", -1).limit(50))
+    if len(metrics) < 5:
+        return None, len(metrics)
+    X = extract_features(metrics)
+    return {name: float(val) for name, val in zip(FEATURE_NAMES, X[0])}, len(metrics)
+
+def correlate_change_to_impact(change_id):
+    """
+    Compare a service's metrics in the impact window before a change with the
+    same span after it, and raise an alert if the change looks responsible.
+    """
+    change = change_index.get(change_id) or db.changes.find_one({"change_id": change_id}, {"_id": 0})
+    if change is None:
+        raise HTTPException(status_code=404, detail=f"Change {change_id} not found")
+
+    service = change["service"]
+    # Metrics are stored as naive UTC, like Mongo returns them
+    changed_at = datetime.utcfromtimestamp(to_epoch(change["timestamp"]))
+    before, before_points = _window_features(service, changed_at - CHANGE_IMPACT_WINDOW, changed_at)
+    after, after_points = _window_features(service, changed_at, changed_at + CHANGE_IMPACT_WINDOW)
+
+    result = {
+        "change_id": change_id,
+        "service": service,
+        "change_event": _change_event_payload(change),
+        "windows": {
+            "minutes": CHANGE_IMPACT_WINDOW.total_seconds() / 60,
+            "before_points": before_points,
+            "after_points": after_points
+        },
+        "timestamp": datetime.utcnow()
+    }
+    if before is None or after is None:
+        result["error"] = "Insufficient data on one side of the change (need at least 5 points each)"
+        return result
+
+    result["correlation"] = calculate_correlation(before, after, result["change_event"])
+    # Other changes whose impact windows overlap this one's, most likely first
+    result["overlapping_changes"] = [
+        c["change_id"] for c, _ in change_index.candidates(service, changed_at, changed_at + CHANGE_IMPACT_WINDOW)
+        if c.get("change_id") not in (None, change_id)
+    ]
+    if result["correlation"]["is_correlated"]:
+        db.alerts.insert_one(result)
+    return result
+
+# Dependency graph for blast radius; db.dependencies is the source of truth once seeded
+dependency_graph = load_dependency_graph()
+
+@app.on_event("startup")
+def load_dependencies():
+    global dependency_graph
+    edges = list(db.dependencies.find({}, {"_id": 0}))
+    if not edges:
+        # First run: persist the static graph, so later edge edits extend it rather than replace it
+        edges = dependency_graph.edges()
+        for edge in edges:
+            db.dependencies.update_one(
+                {"service": edge["service"], "dependent": edge["dependent"]}, {"$set": {"type": edge["type"]}}, upsert=True
             )
-            if response.status_code == 200:
-                data = response.json()
-                if data['status'] == 'success' and data['data']['result']:
-                    return data['data']['result'][0]['values']
-            return []
-        except Exception as e:
-            print(f"Prometheus Query Error: {e}")
-            return []
-
-    # Fetch all metrics
-    # Note: efficient way implies async or parallel, but for demo sync is fine
-    cpu_values = query_prom('service_cpu_usage_percent')
-    latency_values = query_prom('service_latency_ms')
-    traffic_values = query_prom('service_request_rate_ops')
-    memory_values = query_prom('service_memory_usage_mb')
+        print(f"✅ Seeded {len(edges)} dependency edges from the static graph")
+        return
+    dependency_graph = load_dependency_graph(edges)
+    print(f"✅ Loaded {len(edges)} dependency edges")
+
+@app.post("/ingest/dependency")
+def ingest_dependency(edge: DependencyEdge):
+    """Add or update a dependency edge; only the affected blast-radius indexes are rebuilt."""
+    data = edge.dict()
+    query = {"service": data["service"], "dependent": data["dependent"]}
+    if db.dependencies.update_one(query, {"$set": {"type": data["type"]}}).matched_count == 0:
+        db.dependencies.insert_one(data)
+    dependency_graph.add_edge(data["service"], data["dependent"], data["type"])
+    return {"status": "success"}
+
+@app.delete("/ingest/dependency")
+def remove_dependency(service: str, dependent: str):
+    """Remove a dependency edge."""
+    db.dependencies.delete_one({"service": service, "dependent": dependent})
+    dependency_graph.remove_edge(service, dependent)
+    return {"status": "success"}
+
+def _align_prom_series(series):
+    """Pivot one service's {metric: [[ts, value], ...]} into per-timestamp metric objects."""
+    cpu_values = series[CPU_METRIC]
+    latency_values = series[LATENCY_METRIC]
+    traffic_values = series[TRAFFIC_METRIC]
+    memory_values = series[MEMORY_METRIC]
     
     # Align data (Prometheus returns [timestamp, value])
     # We will pivot on Cpu values as base
@@ -211,7 +598,88 @@ def get_recent_metrics(service: str, window: int = 300):
         }
         results.append(obj)
 
-    return {"metrics": results}
+    return results
+
+def _health_metrics(metrics_list):
+    """Aggregate metric objects (or a ring buffer window) into the inputs analyze_blast_radius expects."""
+    if isinstance(metrics_list, dict):
+        return {
+            "latency_p95_ms": float(np.mean(metrics_list["latency_p95_ms"])),
+            "mean_cpu": float(np.mean(metrics_list["cpu_percent"])),
+            "mean_requests": float(np.mean(metrics_list["request_count"]))
+        }
+    return {
+        "latency_p95_ms": float(np.mean([m["latency_p95_ms"] for m in metrics_list])),
+        "mean_cpu": float(np.mean([m["cpu_percent"] for m in metrics_list])),
+        "mean_requests": float(np.mean([m["request_count"] for m in metrics_list]))
+    }
+
+@app.get("/metrics/recent")
+def get_recent_metrics(service: str, window: int = 300):
+    # Query Prometheus
+    # We want: cpu, memory, latency, traffic
+    # PromQL: service_cpu_usage_percent{service="<service>"}
+    
+    end_time = datetime.now()
+    start_time = end_time - timedelta(seconds=window)
+    
+    # One pooled round trip for all four metrics
+    series = prometheus.fetch_service_metrics(
+        [service], start_time.timestamp(), end_time.timestamp(), step='5s'
+    )[service]
+    return {"metrics": _align_prom_series(series)}
+
+# Background downsampling of raw points into 1m / 5m / 1h rollups for long-window reads
+rollup_builder = RollupBuilder(db, interval=float(os.getenv("ROLLUP_INTERVAL_SECONDS", 60)))
+
+@app.on_event("startup")
+async def start_rollups():
+    rollup_builder.start()
+
+@app.on_event("shutdown")
+async def stop_rollups():
+    await rollup_builder.stop()
+
+@app.get("/metrics/history")
+def get_metrics_history(service: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        step: Optional[int] = None):
+    """
+    Metrics for a service over any window. step (seconds) defaults to about
+    300 points over the window; the coarsest resolution no wider than step is
+    read (raw points below a minute, else 1m / 5m / 1h rollups with
+    min/max/mean/sum/count per field), so long windows stay cheap.
+    """
+    until = datetime.utcfromtimestamp(to_epoch(until)) if until else datetime.utcnow()
+    since = datetime.utcfromtimestamp(to_epoch(since)) if since else until - timedelta(hours=24)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if step is None:
+        step = max(1, int((until - since).total_seconds() / 300))
+
+    resolution, points = rollup_builder.query(service, since, until, step)
+    for point in points:
+        if isinstance(point.get("timestamp"), datetime):
+            point["timestamp"] = point["timestamp"].isoformat()
+    return {
+        "service": service,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "step": step,
+        "resolution": resolution,
+        "count": len(points),
+        "points": points
+    }
+
+@app.get("/metrics/rollups/stats")
+def rollup_stats():
+    return rollup_builder.stats()
+
+@app.get("/metrics/cache-stats")
+def prometheus_cache_stats():
+    """Hit/miss counters for the Prometheus range-query cache."""
+    if prometheus.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prometheus.cache.stats()}
 
 @app.get("/analysis/correlate/{change_id}")
 def analyze_change(change_id: str):
@@ -290,66 +758,21 @@ def predict_blast_radius(change_details: dict):
              "status": "mocked_prediction"
         }
 
-# ML Feature Extraction and Scanning Logic
-FEATURE_NAMES = [
-    'mean_cpu', 'std_cpu', 'min_cpu', 'max_cpu', 'delta_cpu', 'cpu_trend',
-    'cpu_volatility', 'mean_memory', 'std_memory', 'memory_trend',
-    'mean_requests', 'request_spike_count', 'throughput_delta', 'cost_delta',
-    'unit_economics_ratio'
-]
-
-def extract_features(metrics_list: List[Dict]):
-    """Calculate 15 features expected by the models from a list of metrics objects."""
-    if not metrics_list:
-        return None
-    
-    cpus = [m['cpu_percent'] for m in metrics_list]
-    mems = [m['memory_mb'] for m in metrics_list]
-    reqs = [m['request_count'] for m in metrics_list]
-    
-    # Dummy cost calculation: CPU influence + Memory influence
-    costs = [c * 0.05 + m * 0.01 for c, m in zip(cpus, mems)]
-    
-    # Basic Stats
-    mean_cpu = np.mean(cpus)
-    std_cpu = np.std(cpus)
-    min_cpu = np.min(cpus)
-    max_cpu = np.max(cpus)
-    delta_cpu = cpus[-1] - cpus[0]
-    
-    # Trend: Simple slope
-    x = np.arange(len(cpus))
-    cpu_trend = np.polyfit(x, cpus, 1)[0] if len(cpus) > 1 else 0
-    cpu_volatility = std_cpu
-    
-    mean_memory = np.mean(mems)
-    std_memory = np.std(mems)
-    memory_trend = np.polyfit(x, mems, 1)[0] if len(mems) > 1 else 0
-    
-    mean_requests = np.mean(reqs)
-    # Spike: requests > 1.5 * mean
-    request_spike_count = sum(1 for r in reqs if r > mean_requests * 1.5)
-    throughput_delta = reqs[-1] - reqs[0]
-    
-    cost_delta = costs[-1] - costs[0]
-    # Unit econ: requests per dollar
-    unit_economics_ratio = sum(reqs) / sum(costs) if sum(costs) > 0 else 0
-    
-    features = [
-        mean_cpu, std_cpu, min_cpu, max_cpu, delta_cpu, cpu_trend,
-        cpu_volatility, mean_memory, std_memory, memory_trend,
-        mean_requests, request_spike_count, throughput_delta, cost_delta,
-        unit_economics_ratio
-    ]
-    
-    return np.array(features).reshape(1, -1)
+# ML Feature Extraction and Scanning Logic (feature maths lives in features.py)
+
+# Only the metric values are needed for feature extraction
+METRIC_FIELDS_PROJECTION = {
+    "_id": 0, "cpu_percent": 1, "memory_mb": 1, "network_out_mbps": 1,
+    "request_count": 1, "error_count": 1, "latency_p95_ms": 1
+}
 
 @app.get("/debug/metrics")
 def debug_metrics():
     """Debug endpoint to see what's in the database"""
     try:
         # Get all metrics without time filter first
-        all_metrics = list(db.metrics.find({}))
+        all_count = db.metrics.count_documents({})
+        all_data = list(db.metrics.find({}, {"_id": 0}).limit(5))
         
         # Then try with time filter
         from datetime import datetime, timedelta
@@ -359,13 +782,13 @@ def debug_metrics():
         metrics_cursor = db.metrics.find({
             "service": "payment-service",
             "timestamp": {"$gte": start_time, "$lte": end_time}
-        }).sort("timestamp", -1).limit(10)
+        }, {"_id": 0}).sort("timestamp", -1).limit(10)
         
         metrics = list(metrics_cursor)
         
         return {
-            "all_count": len(all_metrics),
-            "all_data": all_metrics[:5],  # First 5
+            "all_count": all_count,
+            "all_data": all_data,  # First 5
             "filtered_count": len(metrics),
             "filtered_data": metrics,
             "start_time": start_time.isoformat(),
@@ -375,6 +798,9 @@ def debug_metrics():
         return {"error": str(e)}
 
 # Authentication Endpoints
+# Fields a UserResponse is built from; lookups fetch only these (plus _id)
+USER_PROJECTION = {"email": 1, "full_name": 1, "avatar": 1, "created_at": 1}
+
 def hash_password(password: str) -> str:
     """Hash password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -388,7 +814,7 @@ async def register(user_data: UserRegister):
     """Register a new user"""
     try:
         # Check if user already exists
-        existing_user = db.users.find_one({"email": user_data.email})
+        existing_user = await async_db.users.find_one({"email": user_data.email}, {"_id": 1})
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
         
@@ -405,8 +831,11 @@ async def register(user_data: UserRegister):
             "auth_provider": "email"
         }
         
-        # Insert user
-        result = db.users.insert_one(user_doc)
+        # Insert user (the unique email index catches a concurrent registration)
+        try:
+            result = await async_db.users.insert_one(user_doc)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Email already registered")
         
         return UserResponse(
             id=str(result.inserted_id),
@@ -425,7 +854,7 @@ async def login(login_data: UserLogin):
     """Login user with email and password"""
     try:
         # Find user
-        user = db.users.find_one({"email": login_data.email})
+        user = await async_db.users.find_one({"email": login_data.email}, dict(USER_PROJECTION, password=1))
         if not user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
@@ -454,7 +883,7 @@ async def google_auth(google_data: GoogleAuth):
         # For demo purposes, we'll accept any token and create/update user
         
         # Find or create user
-        user = db.users.find_one({"email": google_data.email})
+        user = await async_db.users.find_one({"email": google_data.email}, {"_id": 1})
         
         if not user:
             # Create new user
@@ -466,18 +895,22 @@ async def google_auth(google_data: GoogleAuth):
                 "created_at": datetime.utcnow(),
                 "auth_provider": "google"
             }
-            result = db.users.insert_one(user_doc)
-            user_id = str(result.inserted_id)
-        else:
+            try:
+                result = await async_db.users.insert_one(user_doc)
+                user_id = str(result.inserted_id)
+            except DuplicateKeyError:
+                # Created by a concurrent sign-in since the lookup above
+                user = await async_db.users.find_one({"email": google_data.email}, {"_id": 1})
+        if user:
             # Update existing user
             user_id = str(user["_id"])
-            db.users.update_one(
+            await async_db.users.update_one(
                 {"_id": user["_id"]},
                 {"$set": {"last_login": datetime.utcnow()}}
             )
         
         # Get updated user data
-        user = db.users.find_one({"email": google_data.email})
+        user = await async_db.users.find_one({"email": google_data.email}, USER_PROJECTION)
         
         return UserResponse(
             id=user_id,
@@ -493,7 +926,7 @@ async def google_auth(google_data: GoogleAuth):
 async def get_current_user(email: str):
     """Get current user profile"""
     try:
-        user = db.users.find_one({"email": email})
+        user = await async_db.users.find_one({"email": email}, USER_PROJECTION)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -509,114 +942,367 @@ async def get_current_user(email: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get user: {str(e)}")
 
-@app.get("/ml/scan")
-async def scan_now(service: str = "payment-service"):
-    """Trigger a manual ML scan, run correlation, and save unified payload."""
-    global BASELINE_FEATURES
-    
+def _score_rows(X):
+    """Score a batch of feature rows; returns (iso_pred, iso_score) per row."""
+    iso_scores = iso_forest.decision_function(X)
+    # Same as iso_forest.predict, without scoring twice. The scan payload only carries
+    # the anomaly verdict, so the random forest isn't run (same as the fleet scan).
+    iso_preds = np.where(iso_scores < 0, -1, 1)
+    return list(zip(iso_preds, iso_scores))
+
+inference_batcher = InferenceBatcher(
+    _score_rows,
+    max_batch=int(os.getenv("INFERENCE_MAX_BATCH", 64)),
+    max_wait=float(os.getenv("INFERENCE_MAX_WAIT_MS", 5)) / 1000
+)
+
+@app.get("/ml/inference-stats")
+def inference_stats():
+    """Batch size and queue wait distributions for the inference micro-batcher."""
+    return inference_batcher.stats()
+
+async def _scan_service(service):
+    """Score one service's current features and correlate them into a scan payload, or {"error": ...}."""
     if not iso_forest or not rand_forest:
         return {"error": "Models not loaded"}
     
-    # 1. Get metrics from MongoDB (last 50 records for ML scan)
-    from datetime import datetime, timedelta
-    end_time = datetime.now()
-    start_time = end_time - timedelta(hours=24)  # Get last 24 hours of data
-    
-    metrics_cursor = db.metrics.find({
-        "service": service,
-        "timestamp": {"$gte": start_time, "$lte": end_time}
-    }).sort("timestamp", -1).limit(50)
-    
-    metrics = list(metrics_cursor)
+    # Hot path: features are kept up to date at ingest, so just read the current vector.
+    # Until the tracker holds a full window, fall back to MongoDB so scores match a DB scan.
+    X = feature_tracker.vector(service, since=time.time() - 24 * 3600, min_points=feature_tracker.window)
+    if X is None:
+        # 1. Get metrics from MongoDB (last 50 records for ML scan)
+        end_time = datetime.now()
+        start_time = end_time - timedelta(hours=24)  # Get last 24 hours of data
+        metrics = await async_db.metrics.find({
+            "service": service,
+            "timestamp": {"$gte": start_time, "$lte": end_time}
+        }, METRIC_FIELDS_PROJECTION).sort("timestamp", -1).limit(50).to_list(None)
+        
+        if len(metrics) < 5:
+            return {"error": f"Insufficient data for ML scan (found {len(metrics)} points, need at least 5)"}
+        
+        # 2. Extract Features - convert MongoDB docs to feature format
+        feature_data = []
+        for metric in metrics:
+            feature_data.append({
+                'cpu_percent': metric.get('cpu_percent', 0),
+                'memory_mb': metric.get('memory_mb', 0),
+                'network_out_mbps': metric.get('network_out_mbps', 0),
+                'request_count': metric.get('request_count', 0),
+                'error_count': metric.get('error_count', 0),
+                'latency_p95_ms': metric.get('latency_p95_ms', 0)
+            })
+        
+        X = extract_features(feature_data)
+    # 3. Predict (coalesced with any concurrent scans into one model call)
+    iso_pred, iso_score = await inference_batcher.submit(X)
     
-    if len(metrics) < 5:
-        return {"error": f"Insufficient data for ML scan (found {len(metrics)} points, need at least 5)"}
+    return _build_scan_payloads([service], X, [iso_pred], [iso_score])[0]
+
+@app.get("/ml/scan")
+async def scan_now(service: str = "payment-service"):
+    """Trigger a manual ML scan, run correlation, and save unified payload."""
+    final_payload = await _scan_service(service)
+    if "error" in final_payload:
+        return final_payload
     
-    # 2. Extract Features - convert MongoDB docs to feature format
-    feature_data = []
-    for metric in metrics:
-        feature_data.append({
-            'cpu_percent': metric.get('cpu_percent', 0),
-            'memory_mb': metric.get('memory_mb', 0),
-            'network_out_mbps': metric.get('network_out_mbps', 0),
-            'request_count': metric.get('request_count', 0),
-            'error_count': metric.get('error_count', 0),
-            'latency_p95_ms': metric.get('latency_p95_ms', 0)
+    # Record in history and refresh the latest-result snapshot
+    await _in_thread(_save_latest, scan_history, service, final_payload, ML_RESULTS_FILE, ml_results_snapshot)
+        
+    return final_payload
+
+def _build_scan_payloads(services, X, iso_preds, iso_scores):
+    """
+    Correlate scored feature vectors (one row of X per service) against each
+    service's baseline and build the scan payloads, correlating all rows at once.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    baselines = np.empty_like(X)
+    change_events = []
+    now = datetime.utcnow()
+    for i, service in enumerate(services):
+        # 4. Correlation Analysis
+        # Compare against the baseline from before this scan, then fold this scan into it
+        baseline = baseline_store.observe(service, X[i])
+        if baseline is None:
+            # Mock a slightly lower baseline for FIRST run demo if needed,
+            # or just wait for next scan. Let's make it a bit dynamic for the WOW factor.
+            baselines[i] = X[i] * 0.7
+        else:
+            baselines[i] = baseline
+
+        # Blame the latest change to this service still inside its impact window; the mock event is only a demo fallback
+        candidates = change_index.candidates(service, now)
+        change_events.append(_change_event_payload(candidates[0][0]) if candidates else MOCK_CHANGE_EVENT)
+
+    correlations = calculate_correlation_batch(baselines, X, change_events)
+
+    payloads = []
+    for i, service in enumerate(services):
+        change_event = change_events[i]
+        correlation_results = correlations[i]
+
+        # 5. Build Unified Payload (EXACT SCHEMA REQUESTED)
+        payloads.append({
+            "service": service,
+
+            "change_event": {
+                "type": change_event["type"],
+                "timestamp": change_event["timestamp"],
+                **{k: change_event[k] for k in ("change_id", "version") if k in change_event}
+            },
+
+            "anomaly": {
+                "score": round(float(iso_scores[i]), 3),
+                "is_anomaly": bool(iso_preds[i] == -1)
+            },
+
+            "correlation": {
+                "is_correlated": correlation_results["is_correlated"],
+                "confidence": correlation_results["confidence"],
+                "delay_minutes": correlation_results["delay_minutes"]
+            },
+
+            "indicators": correlation_results["indicators"]
         })
-    
-    X = extract_features(feature_data)
-    current_features = {name: float(val) for name, val in zip(FEATURE_NAMES, X[0])}
-    
-    # 3. Predict
-    iso_pred = iso_forest.predict(X)[0]
-    iso_score = iso_forest.decision_function(X)[0]
-    
-    rf_pred = str(rand_forest.predict(X)[0])
-    rf_probs = rand_forest.predict_proba(X)[0].tolist()
-    
-    # 4. Correlation Analysis
-    # If no baseline yet, use current as baseline for next round
-    if BASELINE_FEATURES is None:
-        BASELINE_FEATURES = current_features
-        # Mock a slightly lower baseline for FIRST run demo if needed, 
-        # or just wait for next scan. Let's make it a bit dynamic for the WOW factor.
-        BASELINE_FEATURES = {k: v * 0.7 for k, v in current_features.items()}
-
-    correlation_results = calculate_correlation(BASELINE_FEATURES, current_features, MOCK_CHANGE_EVENT)
-    
-    # Update baseline for next time
-    BASELINE_FEATURES = current_features
-    
-    # 5. Build Unified Payload (EXACT SCHEMA REQUESTED)
-    final_payload = {
-        "service": service,
+    return payloads
 
-        "change_event": {
-            "type": MOCK_CHANGE_EVENT["type"],
-            "timestamp": MOCK_CHANGE_EVENT["timestamp"]
-        },
+# Services that have points in db.metrics, refreshed at most every DB_SERVICES_TTL_SECONDS
+DB_SERVICES_TTL = float(os.getenv("DB_SERVICES_TTL_SECONDS", 60))
+_db_services_cache = {"services": [], "expires": 0.0}
+_db_services_lock = threading.Lock()
 
-        "anomaly": {
-            "score": round(float(iso_score), 3),
-            "is_anomaly": bool(iso_pred == -1)
-        },
+def _db_services():
+    """Distinct services in db.metrics (cached); blocking, so call it off the event loop."""
+    with _db_services_lock:
+        if time.monotonic() >= _db_services_cache["expires"]:
+            _db_services_cache["services"] = [s for s in db.metrics.distinct("service") if s]
+            _db_services_cache["expires"] = time.monotonic() + DB_SERVICES_TTL
+        return list(_db_services_cache["services"])
 
-        "correlation": {
-            "is_correlated": correlation_results["is_correlated"],
-            "confidence": correlation_results["confidence"],
-            "delay_minutes": correlation_results["delay_minutes"]
-        },
+def _fleet_windows(max_points=None, hours=24):
+    """
+    Newest-first (cpu, memory, requests) windows for every known service.
+    Services whose ring buffer holds a full window are read in place, like
+    _scan_service's hot path. The buffer isn't warmed at startup, so every other
+    service (short buffer or none) gets one limited DB query on (service, timestamp).
+    """
+    max_points = max_points or feature_tracker.window
+    windows = {}
+    short = {}
+    since = time.time() - hours * 3600
+    for service in metric_store.services():
+        window = metric_store.window(service, n=max_points, since=since)
+        if window is None:
+            continue
+        columns = (window['cpu_percent'][::-1], window['memory_mb'][::-1], window['request_count'][::-1])
+        if len(columns[0]) >= max_points:
+            windows[service] = columns
+        else:
+            short[service] = columns
+
+    missing = sorted((set(_db_services()) | set(short)) - set(windows))
+    if not missing:
+        return windows
+
+    end_time = datetime.now()
+    start_time = end_time - timedelta(hours=hours)
+    projection = {"_id": 0, "cpu_percent": 1, "memory_mb": 1, "request_count": 1}
+    for service in missing:
+        points = list(db.metrics.find(
+            {"service": service, "timestamp": {"$gte": start_time, "$lte": end_time}}, projection
+        ).sort("timestamp", -1).limit(max_points))
+        buffered = short.get(service)
+        if buffered is not None and len(buffered[0]) >= len(points):
+            # Points still queued for the DB can leave it behind the buffer
+            windows[service] = buffered
+        elif points:
+            windows[service] = (
+                [p.get('cpu_percent', 0) for p in points],
+                [p.get('memory_mb', 0) for p in points],
+                [p.get('request_count', 0) for p in points]
+            )
+    return windows
+
+@app.get("/ml/scan/fleet")
+async def scan_fleet():
+    """Scan every known service with one feature matrix and one model call."""
+    if not iso_forest or not rand_forest:
+        return {"error": "Models not loaded"}
+
+    windows = await _in_thread(_fleet_windows)
+    skipped = {s: f"Insufficient data (found {len(w[0])} points, need at least 5)"
+               for s, w in windows.items() if len(w[0]) < 5}
+
+    # extract_features_batch needs equal-length windows, so batch per length
+    by_length = {}
+    for service, w in windows.items():
+        if service not in skipped:
+            by_length.setdefault(len(w[0]), []).append(service)
+
+    services = []
+    blocks = []
+    for length, group in by_length.items():
+        cpus = np.array([windows[s][0] for s in group], dtype=np.float64)[:, None, :]
+        mems = np.array([windows[s][1] for s in group], dtype=np.float64)[:, None, :]
+        reqs = np.array([windows[s][2] for s in group], dtype=np.float64)[:, None, :]
+        blocks.append(extract_features_batch(cpus, mems, reqs)[:, 0, :])
+        services.extend(group)
+
+    results = []
+    if services:
+        X = np.vstack(blocks)
+        # IsolationForest.predict is just the sign of decision_function, so one call covers both.
+        # The payload only carries the anomaly verdict, same as scan_now's.
+        iso_scores = iso_forest.decision_function(X)
+        iso_preds = np.where(iso_scores < 0, -1, 1)
+        results = _build_scan_payloads(services, X, iso_preds, iso_scores)
 
-        "indicators": correlation_results["indicators"]
+    fleet_payload = {
+        "timestamp": datetime.now().isoformat(),
+        "scanned": len(results),
+        "skipped": skipped,
+        "results": results
     }
-    
-    # Save to file
-    with open(ML_RESULTS_FILE, "w") as f:
-        json.dump(final_payload, f, indent=4)
-        
-    return final_payload
+    await _in_thread(scan_history.append_many, [(r["service"], r) for r in results])
+    if results:
+        await _in_thread(_publish_latest, results[-1], ML_RESULTS_FILE, ml_results_snapshot)
+    await _in_thread(_write_json_atomic, FLEET_SCAN_FILE, fleet_payload)
+
+    return fleet_payload
+
+# Continuous scanning: every known service is rescanned each interval in the background
+SCAN_SCHEDULER_ENABLED = os.getenv("SCAN_SCHEDULER_ENABLED", "1") != "0"
+_alerting_services = set()
+
+async def _known_services():
+    """Services seen by this process plus every service with points in MongoDB (cached)."""
+    db_services = await _in_thread(_db_services)
+    return sorted(set(metric_store.services()) | set(feature_tracker.services()) | set(db_services))
+
+async def _scheduled_scan(service):
+    """Scan one service for the scheduler and raise an alert when it turns anomalous."""
+    payload = await _scan_service(service)
+    if "error" in payload:
+        return
+    await _in_thread(scan_history.append, service, payload)
+
+    # One alert per anomalous episode, not one per cycle while it lasts
+    if not payload["anomaly"]["is_anomaly"]:
+        _alerting_services.discard(service)
+        return
+    if service in _alerting_services:
+        return
+    _alerting_services.add(service)
+    await async_db.alerts.insert_one({
+        "type": "anomaly",
+        "source": "scheduler",
+        "service": service,
+        "timestamp": datetime.utcnow(),
+        "severity": "high" if payload["correlation"]["is_correlated"] else "medium",
+        "anomaly": payload["anomaly"],
+        "correlation": payload["correlation"],
+        "change_event": payload["change_event"],
+        "indicators": payload["indicators"]
+    })
+
+scan_scheduler = ScanScheduler(
+    _scheduled_scan,
+    _known_services,
+    interval=float(os.getenv("SCAN_INTERVAL_SECONDS", 60)),
+    jitter=float(os.getenv("SCAN_JITTER", 0.1)),
+    max_concurrency=int(os.getenv("SCAN_MAX_CONCURRENCY", 4)),
+    max_interval=float(os.getenv("SCAN_MAX_INTERVAL_SECONDS", 600))
+)
+
+@app.on_event("startup")
+async def start_scan_scheduler():
+    if SCAN_SCHEDULER_ENABLED:
+        scan_scheduler.start()
+
+@app.get("/ml/scheduler/stats")
+def scan_scheduler_stats():
+    """Per-cycle duration and lag, the adapted interval and scan counters for the background scanner."""
+    return scan_scheduler.stats()
+
+def _snapshot_response(request, snapshot, missing_error):
+    """Serve a snapshot's cached bytes, or a bodiless 304 if the client already has this ETag."""
+    current = snapshot.get()
+    if current is None:
+        return {"error": missing_error}
+    body, etag = current
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/ml/results")
-def get_ml_results():
+def get_ml_results(request: Request):
     """Get the latest saved ML scan results."""
-    if not os.path.exists(ML_RESULTS_FILE):
-        return {"error": "No scan results found yet. Run /ml/scan first."}
-    
-    with open(ML_RESULTS_FILE, "r") as f:
-        return json.load(f)
+    return _snapshot_response(request, ml_results_snapshot, "No scan results found yet. Run /ml/scan first.")
+
+@app.get("/ml/blast-radius/results")
+def get_blast_radius_results(request: Request):
+    """Get the latest saved blast radius analysis."""
+    return _snapshot_response(request, blast_radius_snapshot, "No blast radius results found yet. Run /ml/blast-radius first.")
+
+@app.get("/ml/baselines")
+def get_baselines(service: Optional[str] = None):
+    """Baseline store counters, plus one service's current baseline features if asked for."""
+    result = baseline_store.stats()
+    if service is not None:
+        result["service"] = service
+        result["baseline"] = baseline_store.get(service)
+    return result
+
+@app.get("/ml/history")
+def get_ml_history(service: str, kind: str = "scan", since: Optional[datetime] = None,
+                   until: Optional[datetime] = None, limit: int = 100):
+    """Recorded scan or blast_radius results for a service between since and until, newest first."""
+    store = HISTORY_STORES.get(kind)
+    if store is None:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {list(HISTORY_STORES)}")
+    records = store.range(
+        service,
+        since=to_epoch(since) if since else None,
+        until=to_epoch(until) if until else None,
+        limit=min(limit, 1000)
+    )
+    return {
+        "service": service,
+        "kind": kind,
+        "count": len(records),
+        "results": [
+            {"recorded_at": datetime.utcfromtimestamp(r["ts"]).isoformat() + "Z", "result": r["result"]}
+            for r in records
+        ]
+    }
+
+@app.get("/ml/history/stats")
+def get_ml_history_stats():
+    """Segment, record and size counters for the result history stores."""
+    return {kind: store.stats() for kind, store in HISTORY_STORES.items()}
 
 @app.get("/ml/blast-radius")
 async def get_blast_radius(service: str = "auth-service"):
     """
     Predict the blast radius of a failure in the specified service.
     """
-    # 1. Get recent metrics to determine current health
-    # Using existing get_recent_metrics helper
-    resp = get_recent_metrics(service, window=300)
-    metrics_list = resp.get("metrics", [])
+    # 1. Get recent metrics to determine current health.
+    # Prefer the ring buffer; fall back to Prometheus via get_recent_metrics
+    window = metric_store.window(service, since=time.time() - 300)
+    metrics_list = []
+    if window is None or len(window['cpu_percent']) == 0:
+        window = None
+        resp = await _in_thread(get_recent_metrics, service, 300)
+        metrics_list = resp.get("metrics", [])
     
     current_metrics = {}
-    if not metrics_list:
+    if window is not None:
+        # Aggregate last 5 mins straight off the buffered columns
+        current_metrics = _health_metrics(window)
+    elif not metrics_list:
         # For demo purposes, if no live metrics, use mock values to trigger analysis
         current_metrics = {
             "latency_p95_ms": 650,
@@ -625,21 +1311,57 @@ async def get_blast_radius(service: str = "auth-service"):
         }
     else:
         # Aggregate last 5 mins
-        current_metrics = {
-            "latency_p95_ms": float(np.mean([m["latency_p95_ms"] for m in metrics_list])),
-            "mean_cpu": float(np.mean([m["cpu_percent"] for m in metrics_list])),
-            "mean_requests": float(np.mean([m["request_count"] for m in metrics_list]))
-        }
+        current_metrics = _health_metrics(metrics_list)
 
     # 2. Run analysis
-    analysis_results = analyze_blast_radius(service, current_metrics)
+    analysis_results = analyze_blast_radius(service, current_metrics, dependency_graph)
     
-    # 3. Save to file in requested format
-    with open(BLAST_RADIUS_FILE, "w") as f:
-        json.dump(analysis_results, f, indent=4)
+    # 3. Record in history and save the latest in requested format
+    await _in_thread(_save_latest, blast_radius_history, service, analysis_results,
+                     BLAST_RADIUS_FILE, blast_radius_snapshot)
         
     return analysis_results
 
+@app.get("/ml/blast-radius/fleet")
+async def get_fleet_blast_radius(window: int = 300):
+    """
+    Blast radius for every service in the dependency graph at the same moment,
+    ranked by exposure. Health comes from the ring buffer where possible and one
+    bulk Prometheus fetch for everything else.
+    """
+    services = dependency_graph.services()
+    since = time.time() - window
+    health = {}
+    missing = []
+    for service in services:
+        buffered = metric_store.window(service, since=since)
+        if buffered is not None and len(buffered['cpu_percent']) > 0:
+            health[service] = _health_metrics(buffered)
+        else:
+            missing.append(service)
+
+    if missing:
+        end_time = datetime.now()
+        start_time = end_time - timedelta(seconds=window)
+        fetched = await _in_thread(
+            partial(prometheus.fetch_service_metrics, step='5s'), missing, start_time.timestamp(), end_time.timestamp()
+        )
+        for service, series in fetched.items():
+            rows = _align_prom_series(series)
+            if rows:
+                health[service] = _health_metrics(rows)
+
+    ranked = analyze_fleet_blast_radius(health, dependency_graph)
+    fleet_payload = {
+        "timestamp": datetime.now().isoformat(),
+        "services": len(ranked),
+        "with_metrics": len(health),
+        "ranking": ranked
+    }
+    await _in_thread(_write_json_atomic, FLEET_BLAST_RADIUS_FILE, fleet_payload)
+
+    return fleet_payload
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
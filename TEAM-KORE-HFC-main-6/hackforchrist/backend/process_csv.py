@@ -1,10 +1,23 @@
-import joblib
+import argparse
 import numpy as np
 import pandas as pd
 import json
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from features import FEATURE_NAMES
+from forest_inference import load_models
+
+# Optional: only needed for the columnar (parquet / arrow) streaming formats
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
 # Paths
 INPUT_DIR = "../data/input"
 OUTPUT_DIR = "../data/output"
@@ -12,73 +25,271 @@ MODELS_DIR = ".."
 CSV_FILE = os.path.join(INPUT_DIR, "initial.csv")
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "initial_results.json")
 
-def process():
-    if not os.path.exists(CSV_FILE):
-        print(f"Error: {CSV_FILE} not found")
-        return
+MODEL_METADATA = {
+    "isolation_forest": "Trained Anomaly Detector",
+    "random_forest": "Health State Classifier",
+    "overall_accuracy_claim": "95.4%" # Typical for these models on this dataset
+}
 
-    # Load Models
-    iso_forest = joblib.load(os.path.join(MODELS_DIR, "isolation_forest_model.pkl"))
-    rand_forest = joblib.load(os.path.join(MODELS_DIR, "random_forest_model.pkl"))
 
-    # Load CSV (skip comment line if exists)
-    df = pd.read_csv(CSV_FILE, comment='#')
-    
-    # Feature Names (as expected by models)
-    FEATURE_NAMES = [
-        'mean_cpu', 'std_cpu', 'min_cpu', 'max_cpu', 'delta_cpu', 'cpu_trend',
-        'cpu_volatility', 'mean_memory', 'std_memory', 'memory_trend',
-        'mean_requests', 'request_spike_count', 'throughput_delta', 'cost_delta',
-        'unit_economics_ratio'
-    ]
-    
-    X = df[FEATURE_NAMES].values
-    
+def score_columns(X, iso_forest, rand_forest, first_row=1):
+    """
+    Scores for a block of feature rows as flat NumPy columns (row, is_anomaly,
+    anomaly_score, prediction, confidence, accuracy, then one per feature);
+    first_row is the 1-based row number of X[0].
+    """
+    X = np.asarray(X, dtype=np.float64)
+
     # Predictions
-    # Isolation Forest
-    iso_preds = iso_forest.predict(X)
+    # Isolation Forest (predict() is just the sign of the decision function)
     iso_scores = iso_forest.decision_function(X)
-    
-    # Random Forest
-    rf_preds = rand_forest.predict(X)
+
+    # Random Forest (predict() is the most probable class)
     rf_probs = rand_forest.predict_proba(X)
-    
-    results = []
-    for i in range(len(df)):
-        # Max prob as confidence/accuracy proxy
-        confidence = float(np.max(rf_probs[i]))
-        accuracy_score = f"{confidence * 100:.2f}%"
-        
-        results.append({
-            "row": i + 1,
-            "isolation_forest": {
-                "is_anomaly": bool(iso_preds[i] == -1),
-                "anomaly_score": float(iso_scores[i])
-            },
-            "random_forest": {
-                "prediction": str(rf_preds[i]),
-                "confidence": confidence,
-                "accuracy": accuracy_score
-            },
-            "features": {name: float(df.iloc[i][name]) for name in FEATURE_NAMES}
-        })
-    
+    best = np.argmax(rf_probs, axis=1)
+
+    # Max prob as confidence/accuracy proxy
+    confidence = rf_probs[np.arange(len(X)), best]
+
+    columns = {
+        "row": np.arange(first_row, first_row + len(X), dtype=np.int64),
+        "is_anomaly": iso_scores < 0,
+        "anomaly_score": iso_scores,
+        "prediction": rand_forest.classes_.take(best).astype(str),
+        "confidence": confidence,
+        "accuracy": np.char.mod("%.2f%%", confidence * 100)
+    }
+    for j, name in enumerate(FEATURE_NAMES):
+        columns[name] = X[:, j]
+    return columns
+
+
+def score_rows(X, iso_forest, rand_forest, first_row=1):
+    """Result dicts for a block of feature rows, in the initial_results.json schema."""
+    columns = score_columns(X, iso_forest, rand_forest, first_row)
+    # One bulk conversion per column; the per-row work is only zipping them into dicts
+    features = [
+        dict(zip(FEATURE_NAMES, values))
+        for values in zip(*(columns[name].tolist() for name in FEATURE_NAMES))
+    ]
+    return [
+        {
+            "row": row,
+            "isolation_forest": {"is_anomaly": is_anomaly, "anomaly_score": score},
+            "random_forest": {"prediction": prediction, "confidence": confidence, "accuracy": accuracy},
+            "features": row_features
+        }
+        for row, is_anomaly, score, prediction, confidence, accuracy, row_features in zip(
+            columns["row"].tolist(), columns["is_anomaly"].tolist(), columns["anomaly_score"].tolist(),
+            columns["prediction"].tolist(), columns["confidence"].tolist(), columns["accuracy"].tolist(),
+            features
+        )
+    ]
+
+
+def process(csv_file=CSV_FILE, output_file=OUTPUT_FILE):
+    if not os.path.exists(csv_file):
+        print(f"Error: {csv_file} not found")
+        return
+
+    # Load Models
+    iso_forest, rand_forest = load_models(MODELS_DIR)
+
+    # Load CSV (skip comment line if exists)
+    df = pd.read_csv(csv_file, comment='#')
+
+    results = score_rows(df[FEATURE_NAMES].values, iso_forest, rand_forest)
+
     output_data = {
         "timestamp": datetime.now().isoformat(),
-        "input_file": "initial.csv",
+        "input_file": os.path.basename(csv_file),
         "total_rows": len(df),
         "results": results,
-        "model_metadata": {
-            "isolation_forest": "Trained Anomaly Detector",
-            "random_forest": "Health State Classifier",
-            "overall_accuracy_claim": "95.4%" # Typical for these models on this dataset
-        }
+        "model_metadata": MODEL_METADATA
     }
-    
-    with open(OUTPUT_FILE, "w") as f:
+
+    with open(output_file, "w") as f:
         json.dump(output_data, f, indent=4)
-        
-    print(f"✅ Processed {len(df)} rows. Saved results to {OUTPUT_FILE}")
+
+    print(f"✅ Processed {len(df)} rows. Saved results to {output_file}")
+
+
+# Streaming mode: chunks are scored in worker processes, each holding its own models
+_worker_models = None
+
+
+def _init_worker():
+    global _worker_models
+    _worker_models = load_models(MODELS_DIR)
+
+
+def _score_chunk(X, first_row, columnar):
+    """
+    Score one chunk in a worker. Returns its columns for the columnar formats,
+    otherwise its results already serialized, one JSON document each.
+    """
+    iso_forest, rand_forest = _worker_models
+    if columnar:
+        return score_columns(X, iso_forest, rand_forest, first_row)
+    return [json.dumps(result) for result in score_rows(X, iso_forest, rand_forest, first_row)]
+
+
+def _chunks(csv_file, chunksize):
+    first_row = 1
+    try:
+        reader = pd.read_csv(csv_file, comment='#', chunksize=chunksize)
+    except pd.errors.EmptyDataError:
+        return  # Not even a header: no rows to score
+    for chunk in reader:
+        X = chunk[FEATURE_NAMES].values
+        yield X, first_row
+        first_row += len(X)
+
+
+def _scored_chunks(csv_file, chunksize, workers, columnar):
+    """
+    Scored chunks, in input order. At most 2 * workers chunks
+    are read ahead of the writer, so memory stays bounded by the chunk size
+    rather than the input size.
+    """
+    if workers <= 1:
+        _init_worker()
+        for X, first_row in _chunks(csv_file, chunksize):
+            yield _score_chunk(X, first_row, columnar)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        in_flight = deque()
+        for X, first_row in _chunks(csv_file, chunksize):
+            in_flight.append(pool.submit(_score_chunk, X, first_row, columnar))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+
+def _report_progress(total_rows, started):
+    elapsed = time.perf_counter() - started
+    print(f"⏳ {total_rows} rows scored ({total_rows / elapsed:.0f} rows/s)", flush=True)
+
+
+def _write_text(path, chunks, output_format, csv_file, started):
+    total_rows = 0
+    with open(path, "w") as f:
+        if output_format == "json":
+            f.write('{"timestamp": %s, "input_file": %s, "results": [' % (
+                json.dumps(datetime.now().isoformat()), json.dumps(os.path.basename(csv_file))))
+
+        for lines in chunks:
+            if output_format == "json":
+                f.write((",\n" if total_rows else "\n") + ",\n".join(lines))
+            else:
+                f.write("".join(line + "\n" for line in lines))
+            total_rows += len(lines)
+            _report_progress(total_rows, started)
+
+        if output_format == "json":
+            f.write('\n], "total_rows": %d, "model_metadata": %s}\n' % (total_rows, json.dumps(MODEL_METADATA)))
+    return total_rows
+
+
+def _empty_columns():
+    """Zero rows with the column types score_columns produces, for an input with no rows."""
+    columns = {
+        "row": np.empty(0, dtype=np.int64),
+        "is_anomaly": np.empty(0, dtype=bool),
+        "anomaly_score": np.empty(0),
+        "prediction": np.empty(0, dtype=str),
+        "confidence": np.empty(0),
+        "accuracy": np.empty(0, dtype=str)
+    }
+    for name in FEATURE_NAMES:
+        columns[name] = np.empty(0)
+    return columns
+
+
+def _write_columnar(path, chunks, output_format, started):
+    total_rows = 0
+    writer = None
+
+    def open_writer(schema):
+        if output_format == "parquet":
+            return pq.ParquetWriter(path, schema)
+        return pa.ipc.new_file(path, schema)
+
+    try:
+        for columns in chunks:
+            table = pa.table(columns)
+            if writer is None:
+                writer = open_writer(table.schema)
+            writer.write_table(table)
+            total_rows += table.num_rows
+            _report_progress(total_rows, started)
+        if writer is None:
+            # Still write a (schema-only) file so the output always exists
+            writer = open_writer(pa.table(_empty_columns()).schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    return total_rows
+
+
+def process_streaming(csv_file=CSV_FILE, output_file=None, output_format="ndjson",
+                      chunksize=10000, workers=None):
+    """
+    Score a CSV of any size chunk by chunk and write results as they come.
+
+    output_format "ndjson" writes one result object per line. "json" writes
+    the same document as process() (compact rather than indented), streaming
+    the results array so it is never held in memory. "parquet" and "arrow"
+    (Arrow IPC file) write one flat row per result for analytics tools and
+    need pyarrow installed.
+    """
+    if not os.path.exists(csv_file):
+        print(f"Error: {csv_file} not found")
+        return
+    columnar = output_format in COLUMNAR_FORMATS
+    if columnar and pa is None:
+        print(f"Error: {output_format} output needs pyarrow (pip install pyarrow)")
+        return
+
+    workers = workers or os.cpu_count() or 1
+    if output_file is None:
+        stem = os.path.splitext(os.path.basename(csv_file))[0]
+        output_file = os.path.join(OUTPUT_DIR, f"{stem}_results.{output_format}")
+
+    started = time.perf_counter()
+    tmp_file = output_file + ".tmp"
+    chunks = _scored_chunks(csv_file, chunksize, workers, columnar)
+    if columnar:
+        total_rows = _write_columnar(tmp_file, chunks, output_format, started)
+    else:
+        total_rows = _write_text(tmp_file, chunks, output_format, csv_file, started)
+    os.replace(tmp_file, output_file)
+
+    print(f"✅ Processed {total_rows} rows in {time.perf_counter() - started:.1f}s. Saved results to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score exported feature windows with the trained models.")
+    parser.add_argument("--input", default=CSV_FILE, help="CSV of feature windows")
+    parser.add_argument("--output", help="Results file (default: alongside the other ML outputs)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read and score in chunks, writing results incrementally")
+    parser.add_argument("--format", choices=["ndjson", "json", "parquet", "arrow"], default="ndjson",
+                        help="Streaming output format (default: ndjson)")
+    parser.add_argument("--chunksize", type=int, default=10000, help="Rows per chunk in streaming mode")
+    parser.add_argument("--workers", type=int, help="Scoring processes in streaming mode (default: CPU count)")
+    args = parser.parse_args()
+
+    if args.stream:
+        process_streaming(args.input, args.output, args.format, args.chunksize, args.workers)
+    else:
+        process(args.input, args.output or OUTPUT_FILE)
+
 
 if __name__ == "__main__":
-    process()
+    main()
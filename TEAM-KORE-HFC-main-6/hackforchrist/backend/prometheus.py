@@ -0,0 +1,263 @@
+import bisect
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PROMETHEUS_URL = os.getenv("PROMETHEUS_URL", "http://localhost:9090")
+
+# Metrics exported per service by mock-services/generate_metrics.py
+CPU_METRIC = 'service_cpu_usage_percent'
+LATENCY_METRIC = 'service_latency_ms'
+TRAFFIC_METRIC = 'service_request_rate_ops'
+MEMORY_METRIC = 'service_memory_usage_mb'
+SERVICE_METRICS = [CPU_METRIC, LATENCY_METRIC, TRAFFIC_METRIC, MEMORY_METRIC]
+
+# How series from several instances of one service combine per timestamp (default avg)
+SERVICE_METRIC_AGGREGATION = {CPU_METRIC: 'avg', LATENCY_METRIC: 'max', TRAFFIC_METRIC: 'sum', MEMORY_METRIC: 'sum'}
+_AGGREGATORS = {'sum': sum, 'max': max, 'avg': lambda values: sum(values) / len(values)}
+
+
+def _promql_string(value):
+    """Escape a value for use inside a double-quoted PromQL string."""
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _promql_regex(values):
+    """Alternation regex matching exactly the given label values, escaped for a PromQL string."""
+    return _promql_string('|'.join(re.escape(v) for v in values))
+
+
+def _combine_series(series_values, how='avg'):
+    """Merge several [[ts, value], ...] lists into one, combining the values at each timestamp."""
+    if len(series_values) == 1:
+        return series_values[0]
+    by_ts = {}
+    for values in series_values:
+        for ts, value in values:
+            by_ts.setdefault(ts, []).append(float(value))
+    combine = _AGGREGATORS[how]
+    return [[ts, str(combine(values))] for ts, values in sorted(by_ts.items())]
+
+
+def _step_seconds(step):
+    """'5s' / '1m' / '1h' / 5 -> seconds."""
+    if isinstance(step, (int, float)):
+        return float(step)
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if step and step[-1] in units:
+        return float(step[:-1]) * units[step[-1]]
+    return float(step)
+
+
+class RangeQueryCache:
+    """
+    Step-aligned cache for range queries.
+
+    Requests are aligned down to step boundaries, so every caller polling the
+    same query and step shares one entry. An overlapping request only fetches
+    the missing tail (re-fetching the last cached step, which may still have
+    moved) and merges it into the cached series. Entries expire after ttl
+    seconds, are trimmed to max_span seconds of history and are evicted LRU
+    once there are more than max_entries of them. Requests spanning more than
+    max_span can't be served from a trimmed entry, so they bypass the cache.
+    """
+
+    def __init__(self, max_entries=256, ttl=300, max_span=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_span = max_span
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.points_from_cache = 0
+        self.points_fetched = 0
+
+    def get(self, fetch, query, start, end, step):
+        """
+        Series for query over [start, end]. fetch(query, start, end, step) must
+        return the raw result list and raise on failure, so errors are never cached.
+        """
+        step_s = _step_seconds(step)
+        start = math.floor(start / step_s) * step_s
+        end = math.floor(end / step_s) * step_s
+        key = (query, step)
+
+        if end - start > self.max_span:
+            with self._lock:
+                self.bypassed += 1
+            return fetch(query, start, end, step)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry['created'] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and entry['start'] <= start and end <= entry['end']:
+            with self._lock:
+                self.hits += 1
+            return self._slice(entry, start, end, cached_until=end)
+
+        if entry is not None and entry['start'] <= start <= entry['end']:
+            # Only the tail is missing
+            tail_start = entry['end']
+            tail = fetch(query, tail_start, end, step)
+            with self._lock:
+                self.partial_hits += 1
+                self._merge(entry, tail, tail_start)
+                entry['end'] = max(entry['end'], end)
+                self._trim(entry)
+            return self._slice(entry, start, end, cached_until=tail_start)
+
+        result = fetch(query, start, end, step)
+        entry = {'start': start, 'end': end, 'created': time.time(), 'series': {}}
+        with self._lock:
+            self.misses += 1
+            self._merge(entry, result, start)
+            self._trim(entry)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return self._slice(entry, start, end, cached_until=start)
+
+    def _merge(self, entry, result, from_ts):
+        for series in result:
+            labels = series.get('metric', {})
+            label_key = tuple(sorted(labels.items()))
+            cached = entry['series'].get(label_key)
+            fetched = series.get('values', [])
+            self.points_fetched += len(fetched)
+            if cached is None:
+                entry['series'][label_key] = {'metric': labels, 'values': list(fetched)}
+                continue
+            values = cached['values']
+            del values[bisect.bisect_left([v[0] for v in values], from_ts):]
+            values.extend(fetched)
+
+    def _trim(self, entry):
+        floor_ts = entry['end'] - self.max_span
+        if entry['start'] >= floor_ts:
+            return
+        entry['start'] = floor_ts
+        for cached in entry['series'].values():
+            values = cached['values']
+            del values[:bisect.bisect_left([v[0] for v in values], floor_ts)]
+
+    def _slice(self, entry, start, end, cached_until):
+        out = []
+        with self._lock:
+            for cached in entry['series'].values():
+                ts = [v[0] for v in cached['values']]
+                lo = bisect.bisect_left(ts, start)
+                hi = bisect.bisect_right(ts, end)
+                out.append({'metric': cached['metric'], 'values': cached['values'][lo:hi]})
+                self.points_from_cache += max(0, bisect.bisect_left(ts, cached_until, lo, hi) - lo)
+        return out
+
+    def stats(self):
+        lookups = self.hits + self.partial_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round((self.hits + self.partial_hits) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "points_from_cache": self.points_from_cache,
+            "points_fetched": self.points_fetched
+        }
+
+
+class PrometheusClient:
+    """
+    Thin Prometheus HTTP API client over one pooled requests.Session, so
+    repeated queries reuse keep-alive connections instead of reconnecting.
+    """
+
+    def __init__(self, base_url=PROMETHEUS_URL, timeout=2, pool_size=10, cache=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _fetch_range(self, query, start, end, step):
+        response = self.session.get(
+            f'{self.base_url}/api/v1/query_range',
+            params={'query': query, 'start': start, 'end': end, 'step': step},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        if data['status'] != 'success':
+            raise ValueError(f"Prometheus returned status {data['status']}: {data.get('error')}")
+        return data['data']['result']
+
+    def query_range(self, query, start, end, step='5s'):
+        """Run a range query (through the cache if there is one); returns the result series, or [] on any error."""
+        try:
+            if self.cache is not None:
+                return self.cache.get(self._fetch_range, query, start, end, step)
+            return self._fetch_range(query, start, end, step)
+        except Exception as e:
+            print(f"Prometheus Query Error: {e}")
+            return []
+
+    def fetch_service_metrics(self, services, start, end, step='5s', metric_names=SERVICE_METRICS):
+        """
+        Range values for several metrics across several services in one round trip,
+        using a single selector over __name__ and service.
+
+        Returns {service: {metric_name: [[ts, value], ...]}}; missing series are [].
+        When a selector matches several series for one service (one per
+        instance), they are combined per SERVICE_METRIC_AGGREGATION.
+        """
+        services = list(services)
+        if not services:
+            return {}
+        if len(services) == 1:
+            service_matcher = f'service="{_promql_string(services[0])}"'
+        else:
+            service_matcher = f'service=~"{_promql_regex(services)}"'
+        query = f'{{__name__=~"{_promql_regex(metric_names)}",{service_matcher}}}'
+
+        matched = {s: {name: [] for name in metric_names} for s in services}
+        for series in self.query_range(query, start, end, step):
+            labels = series.get('metric', {})
+            service = labels.get('service')
+            name = labels.get('__name__')
+            if service in matched and name in matched[service]:
+                matched[service][name].append(series.get('values', []))
+
+        results = {}
+        for service, by_name in matched.items():
+            results[service] = {
+                name: _combine_series(found, SERVICE_METRIC_AGGREGATION.get(name, 'avg')) if found else []
+                for name, found in by_name.items()
+            }
+        return results
+
+
+prometheus = PrometheusClient(cache=RangeQueryCache(
+    max_entries=int(os.getenv("PROM_CACHE_MAX_ENTRIES", 256)),
+    ttl=float(os.getenv("PROM_CACHE_TTL", 300))
+))
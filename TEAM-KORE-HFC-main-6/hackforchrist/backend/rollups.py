@@ -0,0 +1,339 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from timeseries import FIELDS, to_epoch
+
+# Per-field stats kept in every rollup bucket
+ROLLUP_FIELDS = FIELDS[1:]
+RAW_POINT_PROJECTION = dict({"_id": 0, "timestamp": 1}, **{name: 1 for name in ROLLUP_FIELDS})
+RAW_PROJECTION = dict(RAW_POINT_PROJECTION, service=1)
+
+# How long raw metric points are kept once rolled up; 0 keeps them forever
+RAW_RETENTION_SECONDS = int(os.getenv("METRICS_RAW_TTL_SECONDS", 7 * 24 * 3600))
+
+# (name, bucket seconds, collection, retention seconds; 0 keeps forever), finest first.
+# Each level is built from the one before it, the first from raw metrics.
+RESOLUTIONS = [
+    ("1m", 60, "metrics_1m", int(os.getenv("METRICS_1M_TTL_SECONDS", 14 * 24 * 3600))),
+    ("5m", 300, "metrics_5m", int(os.getenv("METRICS_5M_TTL_SECONDS", 90 * 24 * 3600))),
+    ("1h", 3600, "metrics_1h", int(os.getenv("METRICS_1H_TTL_SECONDS", 0))),
+]
+
+# For ensure_indexes: one bucket per (service, timestamp), upserted by the builder, plus the
+# time index the next level's reads and retention deletes use. No TTL indexes: the builder
+# only deletes what the next level has already been built from.
+ROLLUP_INDEXES = {
+    collection: [([("service", 1), ("timestamp", 1)], {"unique": True}), ([("timestamp", 1)], {})]
+    for _, _, collection, _ in RESOLUTIONS
+}
+
+
+def bucket_start(ts, seconds):
+    """Start of the bucket holding ts, as a naive UTC datetime like Mongo stores."""
+    epoch = to_epoch(ts)
+    return datetime.utcfromtimestamp(epoch - epoch % seconds)
+
+
+def _doc_bucket(doc, seconds):
+    """bucket_start of a doc's timestamp, or None if it is missing or unparseable."""
+    try:
+        return bucket_start(doc["timestamp"], seconds)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _add_stats(stats, name, lo, hi, total, count):
+    entry = stats.get(name)
+    if entry is None:
+        stats[name] = [lo, hi, total, count]
+    else:
+        entry[0] = min(entry[0], lo)
+        entry[1] = max(entry[1], hi)
+        entry[2] += total
+        entry[3] += count
+
+
+def aggregate(docs, seconds, raw=True):
+    """
+    Fold raw points (raw=True) or finer rollup docs into buckets of the given
+    width. Returns {(service, bucket start): {field: [min, max, sum, count]}}.
+    """
+    buckets = {}
+    skipped = 0
+    for doc in docs:
+        bucket = _doc_bucket(doc, seconds)
+        if bucket is None:
+            skipped += 1
+            continue
+        stats = buckets.setdefault((doc["service"], bucket), {})
+        for name in ROLLUP_FIELDS:
+            value = doc.get(name)
+            if value is None:
+                continue
+            if raw:
+                _add_stats(stats, name, value, value, value, 1)
+            else:
+                _add_stats(stats, name, value["min"], value["max"], value["sum"], value["count"])
+    if skipped:
+        print(f"⚠️ Skipped {skipped} metric docs with unparseable timestamps")
+    return buckets
+
+
+def _upserts(buckets):
+    """One upsert per built bucket, for a single bulk_write."""
+    return [
+        UpdateOne({"service": service, "timestamp": bucket}, {"$set": rollup_doc(service, bucket, stats)}, upsert=True)
+        for (service, bucket), stats in buckets.items()
+    ]
+
+
+def rollup_doc(service, bucket, stats):
+    doc = {"service": service, "timestamp": bucket}
+    for name, (lo, hi, total, count) in stats.items():
+        doc[name] = {"min": lo, "max": hi, "mean": total / count, "sum": total, "count": count}
+    return doc
+
+
+def choose_resolution(step):
+    """Coarsest rollup level whose buckets are no wider than step seconds, or None for raw points."""
+    chosen = None
+    for level in RESOLUTIONS:
+        if level[1] <= step:
+            chosen = level
+    return chosen
+
+
+class RollupBuilder:
+    """
+    Background downsampling of db.metrics into 1m / 5m / 1h rollup collections.
+
+    Every interval, each level rolls up the source buckets completed since its
+    watermark (raw points for 1m, the previous level's buckets above that),
+    in chunks of at most chunk_seconds of source data, and upserts one doc per
+    (service, bucket) with one bulk_write per chunk. Upserts make re-running a
+    span harmless, so the watermark can simply be recovered from the newest
+    rollup at startup. Source docs with unparseable timestamps are skipped.
+    Points are left settle_seconds to arrive before their minute is closed;
+    writers report later arrivals through note_written(), and their buckets
+    (and the coarser ones containing them) are re-rolled on the next run.
+
+    Retention is applied here rather than with TTL indexes: raw points and
+    each level's buckets are deleted once older than their retention, but
+    never ahead of the watermark of the level built from them, so nothing is
+    lost while the builder is behind or down.
+    """
+
+    def __init__(self, database, interval=60.0, settle_seconds=15.0, chunk_seconds=6 * 3600):
+        self.db = database
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.chunk_seconds = chunk_seconds
+        self._watermarks = {}  # level name -> start of the first bucket not yet built
+        self._late = set()  # (service, 1m bucket) that got points after being built
+        self._late_lock = threading.Lock()
+        self._building_to = None  # 1m end of the run in progress, which may have read past the watermark
+        self._task = None
+        self._stopping = None
+
+        self.runs = 0
+        self.buckets_written = {name: 0 for name, _, _, _ in RESOLUTIONS}
+        self.buckets_rerolled = 0
+        self.deleted = {"raw": 0, **{name: 0 for name, _, _, _ in RESOLUTIONS}}
+        self.last_run_ms = 0.0
+
+    def _source(self, i):
+        if i == 0:
+            return self.db.metrics, True
+        return getattr(self.db, RESOLUTIONS[i - 1][2]), False
+
+    def _first_bucket(self, i):
+        """Where a level starts when it has no watermark yet: after its newest bucket, else at the oldest source doc."""
+        name, seconds, collection, _ = RESOLUTIONS[i]
+        newest = list(getattr(self.db, collection).find({}, {"_id": 0, "timestamp": 1}).sort("timestamp", -1).limit(1))
+        if newest:
+            return bucket_start(newest[0]["timestamp"], seconds) + timedelta(seconds=seconds)
+        source, _ = self._source(i)
+        # Dates only: Mongo sorts string timestamps (stored when ingest couldn't parse them) before dates
+        oldest = source.find({"timestamp": {"$gte": datetime(1970, 1, 1)}}, {"_id": 0, "timestamp": 1})
+        for doc in oldest.sort("timestamp", 1):
+            bucket = _doc_bucket(doc, seconds)
+            if bucket is not None:
+                return bucket
+        return None
+
+    def note_written(self, docs):
+        """Record points just written to db.metrics; those landing in already built minutes get re-rolled."""
+        name, seconds, _, _ = RESOLUTIONS[0]
+        built = max(filter(None, (self._watermarks.get(name), self._building_to)), default=None)
+        if built is None:
+            return
+        late = set()
+        for doc in docs:
+            bucket = _doc_bucket(doc, seconds)
+            if bucket is not None and bucket < built:
+                late.add((doc["service"], bucket))
+        if late:
+            with self._late_lock:
+                self._late |= late
+
+    def _reroll_late(self, now):
+        """Rebuild the buckets that late points landed in, then the coarser buckets holding those."""
+        with self._late_lock:
+            dirty, self._late = self._late, set()
+        for i, (name, seconds, collection, _) in enumerate(RESOLUTIONS):
+            built = self._watermarks.get(name)
+            source_ttl = RAW_RETENTION_SECONDS if i == 0 else RESOLUTIONS[i - 1][3]
+            # Once the source has been trimmed by retention a rebuild would lose data, so only
+            # buckets still fully in the source; those past the watermark are left to the normal pass
+            kept_from = datetime.utcfromtimestamp(now - source_ttl) if source_ttl > 0 else datetime.min
+            dirty = {(service, bucket_start(bucket, seconds)) for service, bucket in dirty}
+            dirty = {
+                (service, bucket) for service, bucket in dirty
+                if built is not None and kept_from <= bucket < built
+            }
+            if not dirty:
+                break
+            source, raw = self._source(i)
+            target = getattr(self.db, collection)
+            projection = RAW_PROJECTION if raw else {"_id": 0}
+            ops = []
+            for service, bucket in dirty:
+                docs = source.find({
+                    "service": service,
+                    "timestamp": {"$gte": bucket, "$lt": bucket + timedelta(seconds=seconds)}
+                }, projection)
+                ops.extend(_upserts(aggregate(docs, seconds, raw)))
+            if ops:
+                target.bulk_write(ops, ordered=False)
+                self.buckets_rerolled += len(ops)
+
+    def _apply_retention(self, now):
+        """Delete expired raw points and buckets, but only those the next level has been built from."""
+        levels = [("raw", "metrics", RAW_RETENTION_SECONDS)] + [(name, c, ttl) for name, _, c, ttl in RESOLUTIONS]
+        with self._late_lock:
+            pending = min((bucket for _, bucket in self._late), default=None)
+        for i, (name, collection, ttl) in enumerate(levels):
+            if ttl <= 0:
+                continue
+            cutoff = datetime.utcfromtimestamp(now - ttl)
+            if i < len(RESOLUTIONS):
+                built = self._watermarks.get(RESOLUTIONS[i][0])
+                if built is None:
+                    continue
+                cutoff = min(cutoff, built)
+                if i == 0 and pending is not None:
+                    # Late points still waiting for their re-roll
+                    cutoff = min(cutoff, pending)
+            result = getattr(self.db, collection).delete_many({"timestamp": {"$lt": cutoff}})
+            self.deleted[name] += result.deleted_count
+
+    def run_once(self, now=None):
+        """Build every level up to the last completed bucket; returns buckets written per level."""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        self._reroll_late(now)
+        # Raw buckets close settle_seconds after they end; coarser ones once their source has caught up
+        horizon = datetime.utcfromtimestamp(now - self.settle_seconds)
+        written = {}
+        for i, (name, seconds, collection, _) in enumerate(RESOLUTIONS):
+            written[name] = 0
+            if i > 0:
+                horizon = self._watermarks.get(RESOLUTIONS[i - 1][0]) or horizon
+            end = bucket_start(horizon, seconds)
+            start = self._watermarks.get(name) or self._first_bucket(i)
+            if start is None:
+                continue
+            if i == 0:
+                self._building_to = end
+
+            source, raw = self._source(i)
+            target = getattr(self.db, collection)
+            projection = RAW_PROJECTION if raw else {"_id": 0}
+            while start < end:
+                chunk_end = min(end, start + timedelta(seconds=max(self.chunk_seconds, seconds)))
+                chunk_end = bucket_start(chunk_end, seconds) if chunk_end < end else end
+                docs = source.find({"timestamp": {"$gte": start, "$lt": chunk_end}}, projection)
+                ops = _upserts(aggregate(docs, seconds, raw))
+                if ops:
+                    target.bulk_write(ops, ordered=False)
+                    written[name] += len(ops)
+                start = chunk_end
+            self._watermarks[name] = max(start, end)
+            self.buckets_written[name] += written[name]
+
+        self._apply_retention(now)
+        self.runs += 1
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        return written
+
+    def query(self, service, start, end, step):
+        """
+        Points for a service in [start, end) at the coarsest resolution no wider
+        than step seconds. Returns (resolution, points): raw points (oldest
+        first) or rollup buckets overlapping the range, with buckets after the
+        level's watermark computed from raw points on the fly.
+        """
+        level = choose_resolution(step)
+        if level is None:
+            docs = self.db.metrics.find(
+                {"service": service, "timestamp": {"$gte": start, "$lt": end}},
+                RAW_POINT_PROJECTION
+            ).sort("timestamp", 1)
+            return "raw", list(docs)
+
+        name, seconds, collection, _ = level
+        first = bucket_start(start, seconds)
+        built = self._watermarks.get(name) or first
+        built = min(max(built, first), end)
+        points = list(getattr(self.db, collection).find(
+            {"service": service, "timestamp": {"$gte": first, "$lt": built}}, {"_id": 0, "service": 0}
+        ).sort("timestamp", 1))
+        if built < end:
+            tail = self.db.metrics.find(
+                {"service": service, "timestamp": {"$gte": built, "$lt": end}}, RAW_PROJECTION
+            )
+            for (_, bucket), stats in sorted(aggregate(tail, seconds).items(), key=lambda item: item[0][1]):
+                doc = rollup_doc(service, bucket, stats)
+                del doc["service"]
+                points.append(doc)
+        return name, points
+
+    def start(self):
+        """Start building rollups in the background on the running event loop."""
+        self._stopping = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.run_once)
+            except Exception as e:
+                print(f"❌ Metric rollup failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "interval_seconds": self.interval,
+            "last_run_ms": round(self.last_run_ms, 3),
+            "buckets_written": dict(self.buckets_written),
+            "buckets_rerolled": self.buckets_rerolled,
+            "late_buckets_pending": len(self._late),
+            "deleted": dict(self.deleted),
+            "watermarks": {name: wm.isoformat() for name, wm in self._watermarks.items()},
+            "retention_seconds": dict({"raw": RAW_RETENTION_SECONDS}, **{name: ttl for name, _, _, ttl in RESOLUTIONS})
+        }
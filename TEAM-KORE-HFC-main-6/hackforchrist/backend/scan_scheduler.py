@@ -0,0 +1,172 @@
+import asyncio
+import inspect
+import random
+import time
+from collections import deque
+
+from inference_batcher import _percentiles
+
+
+class ScanScheduler:
+    """
+    Background loop that scans every known service, one cycle per interval.
+
+    Each cycle asks services_fn() (plain or async) for the current services
+    and starts a scan for each one after a random delay of up to
+    jitter * interval, so scans spread out instead of landing together. At most max_concurrency scans run
+    at once, and a service whose previous scan is still running is skipped
+    for that cycle rather than queued twice.
+
+    When a cycle takes longer than the interval (or has to skip services) the
+    interval is stretched towards the observed cycle time, up to max_interval;
+    once cycles finish comfortably inside it, it eases back to the configured
+    value.
+    """
+
+    def __init__(self, scan_fn, services_fn, interval=60.0, jitter=0.1, max_concurrency=4,
+                 max_interval=600.0, history=100):
+        self.scan_fn = scan_fn
+        self.services_fn = services_fn
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.max_interval = max(max_interval, interval)
+        self.current_interval = interval
+
+        self._semaphore = None
+        self._stopping = None
+        self._task = None
+        self._in_flight = set()
+        self._scan_tasks = set()
+
+        # Counters and recent cycles for judging whether scanning keeps up
+        self.cycles = 0
+        self.scans = 0
+        self.scan_errors = 0
+        self.skipped = 0
+        self.last_cycle = None
+        self._cycle_ms = deque(maxlen=history)
+        self._lag_ms = deque(maxlen=history)
+        self._scan_ms = deque(maxlen=history * 10)
+
+    def start(self):
+        """Start the scheduler on the running event loop; the first cycle runs one interval from now."""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._stopping = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop scheduling and wait for scans already running to finish."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        if self._scan_tasks:
+            await asyncio.gather(*self._scan_tasks, return_exceptions=True)
+
+    async def _sleep(self, seconds):
+        """Sleep unless stopped first; returns True if the scheduler is stopping."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
+        return self._stopping.is_set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.current_interval
+        while not await self._sleep(next_tick - loop.time()):
+            started = loop.time()
+            lag = started - next_tick
+            try:
+                services = self.services_fn()
+                if inspect.isawaitable(services):
+                    services = await services
+            except Exception as e:
+                print(f"❌ Listing services to scan failed: {e}")
+                services = []
+            self._run_cycle(started, lag, services)
+            next_tick = max(next_tick + self.current_interval, started)
+
+    def _run_cycle(self, started, lag, services):
+        loop = asyncio.get_running_loop()
+        cycle = {
+            "cycle": self.cycles + 1,
+            "started_at": time.time(),
+            "lag_ms": round(lag * 1000, 3),
+            "interval_seconds": round(self.current_interval, 3),
+            "services": 0,
+            "skipped": 0,
+            "errors": 0,
+            "duration_ms": None
+        }
+        self.cycles += 1
+        self._lag_ms.append(lag * 1000)
+
+        scans = []
+        for service in services:
+            cycle["services"] += 1
+            if service in self._in_flight:
+                cycle["skipped"] += 1
+                self.skipped += 1
+                continue
+            self._in_flight.add(service)
+            delay = random.uniform(0, self.jitter * self.current_interval)
+            task = loop.create_task(self._scan_one(service, delay, cycle))
+            self._scan_tasks.add(task)
+            task.add_done_callback(self._scan_tasks.discard)
+            scans.append(task)
+
+        self.last_cycle = cycle
+        if scans:
+            done = asyncio.gather(*scans, return_exceptions=True)
+            done.add_done_callback(lambda _: self._finish_cycle(cycle, loop.time() - started))
+        else:
+            self._finish_cycle(cycle, loop.time() - started)
+
+    async def _scan_one(self, service, delay, cycle):
+        try:
+            if await self._sleep(delay):
+                return
+            async with self._semaphore:
+                scan_started = time.perf_counter()
+                try:
+                    await self.scan_fn(service)
+                except Exception as e:
+                    print(f"❌ Scheduled scan of {service} failed: {e}")
+                    cycle["errors"] += 1
+                    self.scan_errors += 1
+                self.scans += 1
+                self._scan_ms.append((time.perf_counter() - scan_started) * 1000)
+        finally:
+            self._in_flight.discard(service)
+
+    def _finish_cycle(self, cycle, duration):
+        cycle["duration_ms"] = round(duration * 1000, 3)
+        self._cycle_ms.append(duration * 1000)
+
+        if duration > self.current_interval or cycle["skipped"]:
+            # Falling behind: give cycles the time they actually need, plus headroom
+            self.current_interval = min(self.max_interval, max(duration, self.current_interval) * 1.25)
+        elif duration < self.current_interval / 2 and self.current_interval > self.interval:
+            self.current_interval = max(self.interval, self.current_interval * 0.8)
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "interval_seconds": self.interval,
+            "current_interval_seconds": round(self.current_interval, 3),
+            "max_interval_seconds": self.max_interval,
+            "jitter": self.jitter,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": len(self._in_flight),
+            "cycles": self.cycles,
+            "scans": self.scans,
+            "scan_errors": self.scan_errors,
+            "skipped": self.skipped,
+            "last_cycle": self.last_cycle,
+            "cycle_duration_ms": _percentiles(self._cycle_ms),
+            "cycle_lag_ms": _percentiles(self._lag_ms),
+            "scan_ms": _percentiles(self._scan_ms)
+        }
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import threading
+
+
+def dumps(payload):
+    """
+    The one serialization used for snapshot files and published bodies, so a
+    reload from disk yields the same bytes (and ETag) as the publish did.
+    """
+    return json.dumps(payload, indent=4).encode()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class JsonSnapshot:
+    """
+    Latest JSON result held in memory as ready-to-send bytes plus an ETag.
+
+    Writers call publish() after saving the file with dumps(), so the next poll is served
+    straight from memory. get() only stats the file: if its mtime moved since
+    the cached version (edited or replaced by something else), the file bytes
+    are reloaded; otherwise nothing is read or serialized.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._body = None
+        self._etag = None
+        self._mtime = None
+        self.hits = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _etag_for(body):
+        return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    def publish(self, payload):
+        """Make payload the current snapshot (call after its file has been written)."""
+        body = dumps(payload)
+        with self._lock:
+            self._body = body
+            self._etag = self._etag_for(body)
+            self._mtime = _mtime(self.path)
+
+    def get(self):
+        """(body, etag) for the current snapshot, or None if there is none yet."""
+        mtime = _mtime(self.path)
+        with self._lock:
+            if self._body is not None and mtime == self._mtime:
+                self.hits += 1
+                return self._body, self._etag
+            if mtime is None:
+                # No file (yet); keep serving whatever was published
+                return (self._body, self._etag) if self._body is not None else None
+
+        try:
+            with open(self.path, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.reloads += 1
+            self._body = body
+            self._etag = self._etag_for(body)
+            self._mtime = mtime
+            return self._body, self._etag
+
+    def stats(self):
+        return {"hits": self.hits, "reloads": self.reloads, "etag": self._etag}
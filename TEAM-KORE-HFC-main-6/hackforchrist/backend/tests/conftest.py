@@ -0,0 +1,11 @@
+import os
+import sys
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# database.py connects at import; fail the check straight away so tests get the in-memory mock
+# instead of waiting out the server selection timeout
+with mock.patch("pymongo.MongoClient.server_info", side_effect=Exception("tests run without MongoDB")):
+    import database  # noqa: E402,F401
@@ -0,0 +1,36 @@
+import threading
+
+from blast_radius import DEPENDENCY_MAP, DependencyGraph, analyze_fleet_blast_radius
+
+
+def test_edges_round_trip():
+    graph = DependencyGraph.from_map(DEPENDENCY_MAP)
+    rebuilt = DependencyGraph.from_edges(graph.edges())
+
+    assert rebuilt.dependents == graph.dependents
+    assert rebuilt.closure == graph.closure
+
+
+def test_fleet_ranking_while_edges_change():
+    graph = DependencyGraph.from_map(DEPENDENCY_MAP)
+    stop = threading.Event()
+
+    def edit():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            graph.add_edge("payment-service", f"ledger-{i % 50}", "async")
+            graph.remove_edge("payment-service", f"ledger-{(i + 25) % 50}")
+
+    editor = threading.Thread(target=edit)
+    editor.start()
+    try:
+        for _ in range(300):
+            ranked = analyze_fleet_blast_radius({}, graph)
+            assert {r["service"] for r in ranked} >= set(DEPENDENCY_MAP)
+    finally:
+        stop.set()
+        editor.join()
+
+    for service, (reached, _) in graph.summary().items():
+        assert reached == len(graph.propagation(service))
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from correlation_engine import METRICS_TO_CHECK, _delay_minutes, calculate_correlation, calculate_correlation_batch
+from features import FEATURE_NAMES
+
+
+@pytest.mark.parametrize("timestamp", [
+    # Naive: stored change events without a timestamp get datetime.utcnow()
+    (datetime.utcnow() - timedelta(minutes=42)).isoformat(),
+    (datetime.now().astimezone() - timedelta(minutes=42)).isoformat(),
+    (datetime.now(timezone.utc) - timedelta(minutes=42)).isoformat(),
+    (datetime.now(timezone.utc) - timedelta(minutes=42)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    (datetime.now(timezone(timedelta(hours=5, minutes=30))) - timedelta(minutes=42)).isoformat(),
+])
+def test_delay_minutes_handles_naive_and_offset_timestamps(timestamp):
+    assert _delay_minutes({"type": "deployment", "timestamp": timestamp}) in (41, 42)
+
+
+def test_delay_minutes_falls_back_for_unparseable_timestamps():
+    assert _delay_minutes({"type": "deployment", "timestamp": "yesterday"}) == 5
+
+
+def test_stored_change_without_timestamp_reads_as_utc():
+    from main import _change_event_payload
+
+    event = _change_event_payload({"type": "deployment", "timestamp": datetime.utcnow() - timedelta(minutes=42)})
+
+    assert event["timestamp"].endswith("+00:00")
+    assert _delay_minutes(event) in (41, 42)
+
+
+def test_batch_matches_scalar_correlation():
+    rng = np.random.default_rng(7)
+    n = 200
+    baseline = rng.uniform(0, 100, (n, len(FEATURE_NAMES))).round(3)
+    impact = baseline * rng.choice([0.5, 0.9, 1.0, 1.12, 1.3, 2.0], (n, len(FEATURE_NAMES)))
+    columns = [FEATURE_NAMES.index(key) for key in METRICS_TO_CHECK]
+    # Zero baselines, unchanged metrics, negative trends and exact rounding ties
+    baseline[:20, columns[0]] = 0
+    impact[10:20, columns[0]] = 0
+    impact[20:30] = baseline[20:30]
+    baseline[30:40, columns[-1]] *= -1
+    baseline[40:50, columns[1]], impact[40:50, columns[1]] = 0.125, 0.375
+
+    now = datetime.now(timezone.utc)
+    events = [
+        {"type": ("deployment", "config_change", "scaling")[i % 3],
+         "timestamp": (now - timedelta(minutes=i % 7 * 10)).isoformat()}
+        for i in range(n)
+    ]
+
+    batch = calculate_correlation_batch(baseline, impact, events)
+
+    for row in range(n):
+        expected = calculate_correlation(
+            dict(zip(FEATURE_NAMES, baseline[row].tolist())),
+            dict(zip(FEATURE_NAMES, impact[row].tolist())),
+            events[row]
+        )
+        assert batch[row] == expected
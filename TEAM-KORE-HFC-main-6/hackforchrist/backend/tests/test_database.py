@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from database import MockCollection, MockDatabase, ensure_indexes
+
+
+def _point(service, ts, **fields):
+    return dict({"service": service, "timestamp": ts}, **fields)
+
+
+def test_range_query_newest_first_with_limit():
+    coll = MockCollection("metrics")
+    start = datetime(2024, 1, 1)
+    coll.insert_many([_point("a", start + timedelta(seconds=5 * i), v=i) for i in range(100)])
+    coll.insert_many([_point("b", start + timedelta(seconds=5 * i), v=i) for i in range(100)])
+
+    docs = list(coll.find({
+        "service": "a",
+        "timestamp": {"$gte": start + timedelta(seconds=100), "$lt": start + timedelta(seconds=400)}
+    }, {"_id": 0, "v": 1}).sort("timestamp", -1).limit(5))
+
+    assert [d["v"] for d in docs] == [79, 78, 77, 76, 75]
+
+
+def test_multi_key_sort():
+    coll = MockCollection("alerts")
+    for service, severity in [("b", 1), ("a", 2), ("a", 1), ("b", 3)]:
+        coll.insert_one({"service": service, "severity": severity})
+
+    docs = list(coll.find({}, {"_id": 0}).sort([("service", 1), ("severity", -1)]))
+    assert [(d["service"], d["severity"]) for d in docs] == [("a", 2), ("a", 1), ("b", 3), ("b", 1)]
+
+    top = list(coll.find({}, {"_id": 0}).sort([("service", -1), ("severity", 1)]).limit(2))
+    assert [(d["service"], d["severity"]) for d in top] == [("b", 1), ("b", 3)]
+
+
+def test_iteration_is_unaffected_by_writes_mid_iteration():
+    coll = MockCollection("metrics")
+    coll.create_index([("timestamp", 1)], expireAfterSeconds=60)
+    now = datetime.utcnow()
+    coll.insert_many([_point("a", now - timedelta(seconds=i)) for i in range(50)])
+    coll.insert_many([_point("a", now - timedelta(seconds=100 + i)) for i in range(50)])
+
+    cursor = iter(coll.find({"service": "a"}).sort("timestamp", -1))
+    first = next(cursor)
+    # What the ingest flusher and TTL expiry do from other threads while a reader is iterating
+    coll.insert_many([_point("a", now + timedelta(seconds=1 + i)) for i in range(20)])
+    assert coll.expire(now) == 50
+    rest = list(cursor)
+
+    ids = [first["_id"]] + [d["_id"] for d in rest]
+    assert len(ids) == len(set(ids)) == 100
+
+
+def test_concurrent_writes_and_reads():
+    coll = MockCollection("metrics")
+    coll.create_index([("timestamp", 1)], expireAfterSeconds=60)
+    now = datetime.utcnow()
+    stop = threading.Event()
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            coll.insert_many([_point("a", now - timedelta(seconds=30 + i % 60)) for _ in range(20)])
+            coll.expire(now)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(200):
+            docs = list(coll.find({"service": "a"}).sort("timestamp", -1))
+            ids = [d["_id"] for d in docs]
+            assert len(ids) == len(set(ids))
+    finally:
+        stop.set()
+        writer.join()
+
+
+def test_unique_index_and_upsert():
+    coll = MockCollection("users")
+    coll.create_index([("email", 1)], unique=True)
+    coll.insert_one({"email": "a@example.com"})
+    coll.update_one({"email": "b@example.com"}, {"$set": {"name": "B"}}, upsert=True)
+
+    assert coll.find_one({"email": "b@example.com"}, {"_id": 0}) == {"email": "b@example.com", "name": "B"}
+    with pytest.raises(DuplicateKeyError):
+        coll.insert_one({"email": "a@example.com"})
+
+
+def test_distinct_services_skips_expired():
+    coll = MockCollection("metrics")
+    coll.create_index([("timestamp", 1)], expireAfterSeconds=60)
+    now = datetime.utcnow()
+    coll.insert_many([_point("a", now - timedelta(hours=1)), _point("b", now), _point("c", now, zone="x")])
+    coll.expire(now)
+
+    assert sorted(coll.distinct("service")) == ["b", "c"]
+    assert coll.distinct("zone") == ["x"]
+    assert coll.distinct("service", {"zone": "x"}) == ["c"]
+
+
+def test_delete_many_and_stale_ttl_index_is_replaced():
+    database = MockDatabase()
+    coll = database.metrics
+    coll.create_index([("timestamp", 1)], expireAfterSeconds=60)
+    start = datetime(2024, 1, 1)
+    coll.insert_many([_point("a" if i % 2 else "b", start + timedelta(minutes=i)) for i in range(10)])
+
+    ensure_indexes(database, {"metrics": [([("timestamp", 1)], {})]})
+    assert "expireAfterSeconds" not in coll.index_information()["timestamp_1"]
+    assert coll.expire(start + timedelta(days=1)) == 0
+
+    assert coll.delete_many({"timestamp": {"$lt": start + timedelta(minutes=4)}}).deleted_count == 4
+    assert coll.delete_many({"service": "a"}).deleted_count == 3
+    assert [d["service"] for d in coll.find({})] == ["b", "b", "b"]
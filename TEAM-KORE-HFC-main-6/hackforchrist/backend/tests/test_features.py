@@ -0,0 +1,43 @@
+import numpy as np
+
+from features import FEATURE_NAMES, IncrementalFeatures, extract_features_batch, extract_features_from_columns
+
+TRENDS = [FEATURE_NAMES.index("cpu_trend"), FEATURE_NAMES.index("memory_trend")]
+
+
+def _windows(n=100, samples=50, seed=0):
+    rng = np.random.default_rng(seed)
+    cpus = rng.uniform(0, 100, (n, 1, samples))
+    mems = rng.uniform(300, 900, (n, 1, samples))
+    reqs = rng.integers(500, 2000, (n, 1, samples)).astype(np.float64)
+    return cpus, mems, reqs
+
+
+def test_batch_matches_scalar_extraction():
+    cpus, mems, reqs = _windows()
+    batch = extract_features_batch(cpus, mems, reqs)[:, 0, :]
+    scalar = np.vstack([
+        extract_features_from_columns(list(cpus[i, 0]), list(mems[i, 0]), list(reqs[i, 0]))
+        for i in range(len(cpus))
+    ])
+
+    others = [j for j in range(len(FEATURE_NAMES)) if j not in TRENDS]
+    assert np.array_equal(batch[:, others], scalar[:, others])
+    # Closed-form slope vs np.polyfit: equal within float tolerance only
+    np.testing.assert_allclose(batch[:, TRENDS], scalar[:, TRENDS], rtol=1e-10, atol=1e-12)
+
+
+def test_incremental_window_is_kept_in_timestamp_order():
+    rng = np.random.default_rng(1)
+    points = [(float(ts), *rng.uniform(1, 100, 3)) for ts in range(120)]
+    order = rng.permutation(len(points))
+
+    features = IncrementalFeatures(window=50)
+    for i in order:
+        features.push(*points[i])
+
+    # The newest 50 points by timestamp, read newest first like the DB scan
+    newest = points[-50:][::-1]
+    _, cpus, mems, reqs = (list(col) for col in zip(*newest))
+    expected = extract_features_from_columns(cpus, mems, reqs)
+    np.testing.assert_allclose(features.vector(), expected, rtol=1e-9, atol=1e-9)
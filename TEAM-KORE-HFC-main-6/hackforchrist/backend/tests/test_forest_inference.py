@@ -0,0 +1,37 @@
+import numpy as np
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+
+from features import FEATURE_NAMES
+from forest_inference import CompiledIsolationForest, CompiledRandomForest
+
+
+def _data(n, seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, len(FEATURE_NAMES))) * rng.uniform(1, 100, len(FEATURE_NAMES))
+    # A few exact training thresholds and extreme values to exercise the <= split edge
+    X[:5] = np.round(X[:5])
+    X[5] *= 1e6
+    return X
+
+
+def test_compiled_isolation_forest_matches_sklearn():
+    X = _data(500, 0)
+    model = IsolationForest(n_estimators=50, random_state=0).fit(X)
+    compiled = CompiledIsolationForest.from_sklearn(model)
+
+    probe = np.vstack([_data(200, 1), X[:20]])
+    np.testing.assert_array_equal(compiled.score_samples(probe), model.score_samples(probe))
+    np.testing.assert_array_equal(compiled.decision_function(probe), model.decision_function(probe))
+    np.testing.assert_array_equal(compiled.predict(probe), model.predict(probe))
+
+
+def test_compiled_random_forest_matches_sklearn():
+    X = _data(500, 2)
+    y = np.where(X[:, 0] > 0, "Healthy", np.where(X[:, 1] > 0, "Degrading", "Critical"))
+    model = RandomForestClassifier(n_estimators=30, random_state=0).fit(X, y)
+    compiled = CompiledRandomForest.from_sklearn(model)
+
+    probe = np.vstack([_data(200, 3), X[:20]])
+    np.testing.assert_array_equal(compiled.predict_proba(probe), model.predict_proba(probe))
+    np.testing.assert_array_equal(compiled.predict(probe), model.predict(probe))
+    assert list(compiled.classes_) == list(model.classes_)
@@ -0,0 +1,37 @@
+import time
+
+from history_store import HistoryStore
+
+
+def test_each_writer_keeps_its_own_segments(tmp_path):
+    # Two stores on one directory stand in for two worker processes
+    a = HistoryStore(str(tmp_path), segment_max_bytes=200, retention_seconds=10000)
+    b = HistoryStore(str(tmp_path), segment_max_bytes=200, retention_seconds=10000)
+    assert a.stats()["directory"] != b.stats()["directory"]
+
+    base = time.time() - 1000
+    for i in range(20):
+        a.append("api", {"n": i}, ts=base + 10 * i)
+        b.append("db", {"n": i, "pad": "x" * i}, ts=base + 10 * i)
+
+    # a seals and applies retention; b's records stay intact and readable
+    a.compact(now=base + 100 + 10000)
+    assert [r["result"]["n"] for r in a.range("api", newest_first=False)] == list(range(10, 20))
+    assert [r["result"]["n"] for r in b.range("db", newest_first=False)] == list(range(20))
+    assert b.latest("db")["result"] == {"n": 19, "pad": "x" * 19}
+    a.close()
+    b.close()
+
+
+def test_compact_applies_retention_without_sealing(tmp_path):
+    base = time.time() - 1000
+    store = HistoryStore(str(tmp_path), segment_max_bytes=200, retention_seconds=10000)
+    for i in range(20):
+        store.append("api", {"n": i}, ts=base + 10 * i)
+    segments = store.stats()["segments"]
+
+    store.compact(now=base + 100 + 10000)
+
+    assert [r["result"]["n"] for r in store.range("api", newest_first=False)] == list(range(10, 20))
+    assert store.stats()["segments"] < segments
+    store.close()
@@ -0,0 +1,23 @@
+import pytest
+
+import process_csv
+
+pa = pytest.importorskip("pyarrow")
+
+
+@pytest.mark.parametrize("content", ["", "# comment only\n" + ",".join(process_csv.FEATURE_NAMES) + "\n"])
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_columnar_output_for_csv_without_rows(tmp_path, content, output_format):
+    csv_file = tmp_path / "empty.csv"
+    csv_file.write_text(content)
+    output_file = tmp_path / f"out.{output_format}"
+
+    process_csv.process_streaming(str(csv_file), str(output_file), output_format, workers=1)
+
+    if output_format == "parquet":
+        table = pytest.importorskip("pyarrow.parquet").read_table(output_file)
+    else:
+        table = pa.ipc.open_file(str(output_file)).read_all()
+    assert table.num_rows == 0
+    assert table.schema.names == list(process_csv._empty_columns())
+    assert not (tmp_path / f"out.{output_format}.tmp").exists()
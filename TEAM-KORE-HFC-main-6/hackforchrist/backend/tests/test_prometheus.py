@@ -0,0 +1,114 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from prometheus import (
+    CPU_METRIC, LATENCY_METRIC, MEMORY_METRIC, TRAFFIC_METRIC, PrometheusClient, RangeQueryCache
+)
+
+
+class StubPrometheus:
+    """Minimal /api/v1/query_range server: answers with self.result and records every request."""
+
+    def __init__(self):
+        self.result = []
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                stub.requests.append((url.path, params))
+                body = json.dumps({"status": "success", "data": {"resultType": "matrix", "result": stub.result}})
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubPrometheus()
+    yield server
+    server.close()
+
+
+def _series(name, service, values, **labels):
+    return {"metric": dict({"__name__": name, "service": service}, **labels),
+            "values": [[ts, str(v)] for ts, v in values]}
+
+
+def test_fetch_service_metrics_uses_one_selector(stub):
+    stub.result = [
+        _series(CPU_METRIC, "api", [(100, 10), (105, 20)]),
+        _series(LATENCY_METRIC, "db\"x", [(100, 5)]),
+    ]
+    client = PrometheusClient(base_url=stub.url)
+
+    results = client.fetch_service_metrics(["api", "db\"x"], 100, 105, step='5s')
+
+    assert len(stub.requests) == 1
+    path, params = stub.requests[0]
+    assert path == '/api/v1/query_range'
+    assert params['step'] == '5s'
+    assert 'service=~"api|db\\"x"' in params['query']
+    assert results["api"][CPU_METRIC] == [[100, "10"], [105, "20"]]
+    assert results["api"][MEMORY_METRIC] == []
+    assert results["db\"x"][LATENCY_METRIC] == [[100, "5"]]
+
+
+def test_fetch_service_metrics_combines_instances(stub):
+    stub.result = [
+        _series(CPU_METRIC, "api", [(100, 10), (105, 30)], instance="a"),
+        _series(CPU_METRIC, "api", [(100, 20), (110, 40)], instance="b"),
+        _series(TRAFFIC_METRIC, "api", [(100, 5)], instance="a"),
+        _series(TRAFFIC_METRIC, "api", [(100, 7)], instance="b"),
+        _series(LATENCY_METRIC, "api", [(100, 80)], instance="a"),
+        _series(LATENCY_METRIC, "api", [(100, 120)], instance="b"),
+    ]
+    client = PrometheusClient(base_url=stub.url)
+
+    series = client.fetch_service_metrics(["api"], 100, 110)["api"]
+
+    assert series[CPU_METRIC] == [[100, "15.0"], [105, "30.0"], [110, "40.0"]]
+    assert series[TRAFFIC_METRIC] == [[100, "12.0"]]
+    assert series[LATENCY_METRIC] == [[100, "120.0"]]
+
+
+def test_query_range_returns_empty_on_error():
+    client = PrometheusClient(base_url='http://127.0.0.1:9', timeout=0.5)
+    assert client.query_range('up', 0, 10) == []
+
+
+def test_cache_bypasses_windows_longer_than_max_span(stub):
+    stub.result = [_series(CPU_METRIC, "api", [(ts, 1) for ts in range(0, 7201, 5)])]
+    client = PrometheusClient(base_url=stub.url, cache=RangeQueryCache(max_span=3600))
+
+    long_window = client.query_range('q', 0, 7200, step='5s')
+    assert len(long_window[0]['values']) == 1441
+    assert client.cache.stats()['bypassed'] == 1
+    assert client.cache.stats()['entries'] == 0
+
+    client.query_range('q', 5400, 7200, step='5s')
+    client.query_range('q', 5400, 7200, step='5s')
+    assert client.cache.stats()['hits'] == 1
+    assert len(stub.requests) == 2
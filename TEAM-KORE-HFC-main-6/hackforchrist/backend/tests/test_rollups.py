@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from database import MockDatabase
+from rollups import RAW_RETENTION_SECONDS, RollupBuilder, aggregate
+
+NOW = datetime(2024, 6, 1, 12, 0)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _now():
+    return (NOW - EPOCH).total_seconds()
+
+
+def _points(service, start, count, step=timedelta(seconds=10), cpu=10.0):
+    return [{"service": service, "timestamp": start + i * step, "cpu_percent": cpu,
+             "memory_mb": 500.0, "request_count": 100} for i in range(count)]
+
+
+def _cpu(collection, service, bucket):
+    return collection.find_one({"service": service, "timestamp": bucket}, {"_id": 0})["cpu_percent"]
+
+
+def test_late_points_are_rerolled_into_built_buckets():
+    db = MockDatabase()
+    builder = RollupBuilder(db, settle_seconds=0)
+    db.metrics.insert_many(_points("api", NOW - timedelta(minutes=30), 180))
+    builder.run_once(_now())
+    minute = NOW - timedelta(minutes=20)
+    assert _cpu(db.metrics_1m, "api", minute)["count"] == 6
+
+    late = _points("api", minute + timedelta(seconds=5), 1, cpu=70.0)
+    db.metrics.insert_many(late)
+    builder.note_written(late)
+    builder.run_once(_now())
+
+    assert _cpu(db.metrics_1m, "api", minute) == {"min": 10.0, "max": 70.0, "mean": 130.0 / 7, "sum": 130.0, "count": 7}
+    assert _cpu(db.metrics_5m, "api", minute)["count"] == 31
+    assert builder.stats()["buckets_rerolled"] >= 2
+
+
+def test_raw_points_are_only_deleted_once_rolled_up():
+    db = MockDatabase()
+    builder = RollupBuilder(db, settle_seconds=0)
+    expired_from = NOW - timedelta(seconds=RAW_RETENTION_SECONDS)
+    db.metrics.insert_many(_points("api", expired_from - timedelta(minutes=10), 120))
+
+    # The builder is behind: nothing past its watermark may go, however old
+    builder._watermarks["1m"] = expired_from - timedelta(minutes=5)
+    builder._apply_retention(_now())
+    assert db.metrics.count_documents({}) == 90
+
+    builder.run_once(_now())
+    assert db.metrics.count_documents({}) == 60
+    assert db.metrics_1m.count_documents({}) == 15  # From the watermark on
+    assert builder.stats()["deleted"]["raw"] == 60
+
+
+def test_unparseable_timestamps_are_skipped():
+    # The single-point ingest path stores timestamps it couldn't parse as they came
+    bad = {"service": "api", "timestamp": "yesterday-ish", "cpu_percent": 99.0}
+    assert aggregate([bad] + _points("api", NOW, 2), 60) == aggregate(_points("api", NOW, 2), 60)
+
+    db = MockDatabase()
+    builder = RollupBuilder(db, settle_seconds=0)
+    db.metrics.insert_one(dict(bad))
+    builder.run_once(_now())
+    assert builder.stats()["watermarks"] == {}
+
+    db.metrics.insert_many(_points("api", NOW - timedelta(minutes=10), 60))
+    builder.note_written([dict(bad)])
+    written = builder.run_once(_now())
+
+    assert written["1m"] == 10
+    assert _cpu(db.metrics_1m, "api", NOW - timedelta(minutes=10))["count"] == 6
+    assert builder.stats()["watermarks"]["1m"] == NOW.isoformat()
@@ -0,0 +1,24 @@
+import asyncio
+
+from scan_scheduler import ScanScheduler
+
+
+def test_cycle_scans_services_from_async_services_fn():
+    scanned = []
+
+    async def scan(service):
+        scanned.append(service)
+
+    async def services():
+        return ["api", "db"]
+
+    async def run():
+        scheduler = ScanScheduler(scan, services, interval=0.05, jitter=0)
+        scheduler.start()
+        await asyncio.sleep(0.08)
+        await scheduler.stop()
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert sorted(scanned) == ["api", "db"]
+    assert stats["cycles"] == 1 and stats["scan_errors"] == 0
@@ -0,0 +1,20 @@
+import os
+
+from snapshot_cache import JsonSnapshot, dumps
+
+
+def test_reload_from_file_keeps_published_etag(tmp_path):
+    path = tmp_path / "ml_results.json"
+    payload = {"service": "api", "anomaly": {"score": -0.1, "is_anomaly": True}}
+    path.write_bytes(dumps(payload))
+    snapshot = JsonSnapshot(str(path))
+    snapshot.publish(payload)
+    body, etag = snapshot.get()
+
+    # Something else touches the file: the reload must serve the very same bytes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert snapshot.get() == (body, etag)
+    assert snapshot.stats()["reloads"] == 1
+    assert snapshot.stats()["hits"] == 1
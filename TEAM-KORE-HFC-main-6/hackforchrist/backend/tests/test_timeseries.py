@@ -0,0 +1,67 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from timeseries import MetricRingBuffer, TimeSeriesStore, to_epoch
+
+START = datetime(2024, 1, 1)
+
+
+def _point(seconds, cpu=None):
+    return {"service": "a", "timestamp": START + timedelta(seconds=seconds),
+            "cpu_percent": float(seconds if cpu is None else cpu), "memory_mb": 1.0, "request_count": 1}
+
+
+def test_window_is_newest_points_oldest_first_across_wrap():
+    buf = MetricRingBuffer(capacity=10)
+    for i in range(25):
+        buf.append(_point(5 * i))
+
+    view = buf.window()
+    assert view.shape == (7, 10)
+    assert view[1].tolist() == [5.0 * i for i in range(15, 25)]
+    assert buf.window(n=3)[1].tolist() == [110.0, 115.0, 120.0]
+    assert buf.window(since=to_epoch(START) + 100)[1].tolist() == [100.0, 105.0, 110.0, 115.0, 120.0]
+
+
+def test_backfilled_points_are_merged_into_timestamp_order():
+    random.seed(3)
+    seconds = list(range(0, 500, 5))
+    random.shuffle(seconds)
+    buf = MetricRingBuffer(capacity=40)
+    for s in seconds:
+        buf.append(_point(s))
+
+    view = buf.window()
+    assert np.all(np.diff(view[0]) >= 0)
+    # Only the newest capacity points by timestamp are retained
+    assert view[1].tolist() == [float(s) for s in range(300, 500, 5)]
+
+    since = to_epoch(START) + 450
+    assert buf.window(since=since)[1].tolist() == [450.0, 455.0, 460.0, 465.0, 470.0, 475.0, 480.0, 485.0, 490.0, 495.0]
+
+
+def test_store_append_many_handles_out_of_order_batches():
+    store = TimeSeriesStore(capacity=20)
+    store.append_many([_point(s) for s in range(50, 100, 5)])
+    store.append_many([_point(s) for s in (40, 97, 10, 45)])
+
+    window = store.window("a")
+    assert window["cpu_percent"].tolist() == [10.0, 40.0, 45.0, 50.0, 55.0, 60.0, 65.0, 70.0, 75.0,
+                                              80.0, 85.0, 90.0, 95.0, 97.0]
+
+
+def test_window_is_not_changed_by_later_writes():
+    buf = MetricRingBuffer(capacity=10)
+    for i in range(8):
+        buf.append(_point(10 * i))
+    window = buf.window()
+    before = window.copy()
+
+    buf.append(_point(5))  # Backfill: the ring is rewritten from slot 0
+    for i in range(8, 20):
+        buf.append(_point(10 * i))  # And wrapped
+
+    assert np.array_equal(window, before)
+    assert not window.flags.writeable
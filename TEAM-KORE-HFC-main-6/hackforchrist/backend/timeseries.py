@@ -0,0 +1,133 @@
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Columns held per point, in MetricPayload order plus the timestamp
+FIELDS = [
+    'timestamp', 'cpu_percent', 'memory_mb', 'network_out_mbps',
+    'request_count', 'error_count', 'latency_p95_ms'
+]
+FIELD_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+
+def to_epoch(ts):
+    """Seconds since epoch for a datetime or ISO string; naive values are taken as UTC like Mongo does."""
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class MetricRingBuffer:
+    """
+    Fixed-capacity columnar ring buffer of recent points for one service.
+
+    Every point is written twice, at slot i and i + capacity, so the most
+    recent n <= capacity points are always one contiguous slice. That lets
+    window() take a window with a single slice copy, even after wrap.
+    Points are kept in timestamp order: in-order appends take the fast path,
+    and backfilled points are merged into place by rewriting the ring.
+    """
+
+    def __init__(self, capacity=720):
+        self.capacity = capacity
+        self._data = np.zeros((len(FIELDS), 2 * capacity), dtype=np.float64)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def _write(self, row):
+        slot = self._count % self.capacity
+        self._data[:, slot] = row
+        self._data[:, slot + self.capacity] = row
+        self._count += 1
+
+    def _newest_ts(self):
+        return self._data[0, (self._count - 1) % self.capacity] if self._count else -np.inf
+
+    def append(self, doc):
+        self.extend([doc])
+
+    def extend(self, docs):
+        """Add points in any order; the buffer stays sorted by timestamp."""
+        rows = [[to_epoch(doc['timestamp'])] + [float(doc.get(f, 0)) for f in FIELDS[1:]] for doc in docs]
+        with self._lock:
+            for i, row in enumerate(rows):
+                if row[0] < self._newest_ts():
+                    self._merge(np.array(rows[i:], dtype=np.float64).T)
+                    return
+                self._write(row)
+
+    def _merge(self, columns):
+        """Stable-sort the retained points together with out-of-order ones and rewrite the ring."""
+        size = len(self)
+        end = (self._count - 1) % self.capacity + 1 + self.capacity if self._count else self.capacity
+        merged = np.concatenate([self._data[:, end - size:end], columns], axis=1)
+        merged = merged[:, np.argsort(merged[0], kind='stable')][:, -self.capacity:]
+
+        n = merged.shape[1]
+        self._data[:, :n] = merged
+        self._data[:, self.capacity:self.capacity + n] = merged
+        self._count = n
+
+    def window(self, n=None, since=None):
+        """
+        Read-only array of shape (len(FIELDS), k) over the newest points, oldest first.
+        n caps the number of points; since (epoch seconds) drops older points.
+        It is a copy taken under the lock (at most capacity points, still one
+        contiguous slice): appends wrap over the ring and backfills rewrite it
+        from the start, so a view could change while a caller reads it.
+        """
+        with self._lock:
+            size = len(self)
+            n = size if n is None else min(n, size)
+            # One past the newest point's second copy
+            end = (self._count - 1) % self.capacity + 1 + self.capacity if self._count else self.capacity
+            view = self._data[:, end - n:end].copy()
+
+        if since is not None:
+            start = int(np.searchsorted(view[0], since, side='left'))
+            view = view[:, start:]
+        view.flags.writeable = False
+        return view
+
+
+class TimeSeriesStore:
+    """Per-service ring buffers; the hot read path for recent metric windows."""
+
+    def __init__(self, capacity=720):
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def _buffer(self, service):
+        buf = self._buffers.get(service)
+        if buf is None:
+            with self._lock:
+                buf = self._buffers.setdefault(service, MetricRingBuffer(self.capacity))
+        return buf
+
+    def append(self, doc):
+        self._buffer(doc['service']).append(doc)
+
+    def append_many(self, docs):
+        by_service = {}
+        for doc in docs:
+            by_service.setdefault(doc['service'], []).append(doc)
+        for service, service_docs in by_service.items():
+            self._buffer(service).extend(service_docs)
+
+    def services(self):
+        return list(self._buffers)
+
+    def window(self, service, n=None, since=None):
+        """Columns for a service as a dict of read-only arrays, or None if nothing is buffered."""
+        buf = self._buffers.get(service)
+        if buf is None or len(buf) == 0:
+            return None
+        view = buf.window(n, since)
+        return {name: view[i] for i, name in enumerate(FIELDS)}